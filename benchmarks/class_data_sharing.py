@@ -0,0 +1,204 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+# Launches a stand-in game through ProfileInstance.launch_version with a real Java, with and without the Class Data Sharing archive,
+# and measures the time until the main class has loaded all of its classes
+# The stand-in classes are generated here, so no Java compiler is needed
+# It also checks that Java really loads the classes from the archive, for every classpath mode
+
+import argparse
+import os
+import struct
+import tempfile
+import time
+import zipfile
+
+import common
+from yamcl.tools import FileTools
+
+class ClassFileWriter:
+    '''
+    Writes minimal Java 8 class files whose methods are straight-line code, which needs no stack map frames
+    '''
+    def __init__(self):
+        self.constant_list = list()
+        self.constant_lookup = dict()
+
+    def _constant(self, constant_key, constant_data):
+        if not constant_key in self.constant_lookup:
+            self.constant_list.append(constant_data)
+            self.constant_lookup[constant_key] = len(self.constant_list)
+        return self.constant_lookup[constant_key]
+
+    def utf8(self, value):
+        raw_value = value.encode("UTF-8")
+        return self._constant(("utf8", value), b"\x01" + struct.pack(">H", len(raw_value)) + raw_value)
+
+    def class_reference(self, class_name):
+        return self._constant(("class", class_name), b"\x07" + struct.pack(">H", self.utf8(class_name)))
+
+    def string(self, value):
+        return self._constant(("string", value), b"\x08" + struct.pack(">H", self.utf8(value)))
+
+    def member_reference(self, tag, class_name, member_name, descriptor):
+        '''
+        'tag' is 9 for a field and 10 for a method
+        '''
+        name_and_type = self._constant(("name_and_type", member_name, descriptor), b"\x0c" + struct.pack(">HH", self.utf8(member_name), self.utf8(descriptor)))
+        return self._constant((tag, class_name, member_name, descriptor), bytes([tag]) + struct.pack(">HH", self.class_reference(class_name), name_and_type))
+
+    def build(self, class_name, method_list):
+        '''
+        Returns the class file of public class 'class_name' with the public static methods in 'method_list',
+        a list of tuples of the name, descriptor, maximum stack size, number of locals and bytecode
+        '''
+        this_class = self.class_reference(class_name)
+        super_class = self.class_reference("java/lang/Object")
+        method_data = b""
+        for method_name, descriptor, max_stack, max_locals, method_code in method_list:
+            code_attribute = struct.pack(">HHI", max_stack, max_locals, len(method_code)) + method_code + struct.pack(">HH", 0, 0)
+            method_data += struct.pack(">HHHH", 0x0009, self.utf8(method_name), self.utf8(descriptor), 1)
+            method_data += struct.pack(">HI", self.utf8("Code"), len(code_attribute)) + code_attribute
+        class_data = b"\xca\xfe\xba\xbe" + struct.pack(">HHH", 0, 52, len(self.constant_list) + 1) + b"".join(self.constant_list)
+        class_data += struct.pack(">HHHHHH", 0x0021, this_class, super_class, 0, 0, len(method_list)) + method_data + struct.pack(">H", 0)
+        return class_data
+
+def helper_class(class_number, method_count):
+    '''
+    Class standin/C<class_number> with static methods f0, f1... that each return their argument plus a constant
+    '''
+    method_list = list()
+    for method_number in range(method_count):
+        # iload_0, sipush, iadd, ireturn
+        method_list.append(("f" + str(method_number), "(I)I", 2, 1, b"\x1a\x11" + struct.pack(">h", method_number + class_number % 1000) + b"\x60\xac"))
+    return ClassFileWriter().build("standin/C" + str(class_number), method_list)
+
+def main_class(class_count):
+    '''
+    Class standin/Main, which calls every helper class, so each is loaded, verified and initialized, then prints "ready"
+    '''
+    class_writer = ClassFileWriter()
+    main_code = b""
+    for class_number in range(class_count):
+        # iconst_1, invokestatic, pop
+        main_code += b"\x04\xb8" + struct.pack(">H", class_writer.member_reference(10, "standin/C" + str(class_number), "f0", "(I)I")) + b"\x57"
+    main_code += b"\xb2" + struct.pack(">H", class_writer.member_reference(9, "java/lang/System", "out", "Ljava/io/PrintStream;"))
+    main_code += b"\x13" + struct.pack(">H", class_writer.string("ready"))
+    main_code += b"\xb6" + struct.pack(">H", class_writer.member_reference(10, "java/io/PrintStream", "println", "(Ljava/lang/String;)V")) + b"\xb1"
+    return class_writer.build("standin/Main", [("main", "([Ljava/lang/String;)V", 2, 1, main_code)])
+
+def install_stand_in(launcher_obj, class_count, library_count, work_directory):
+    '''
+    Installs custom version "standin", whose classes are spread over its jar and 'library_count' libraries
+    '''
+    jar_path_list = [os.path.join(work_directory, "jar" + str(jar_number) + ".jar") for jar_number in range(library_count + 1)]
+    jar_file_list = [zipfile.ZipFile(jar_path, mode="w") for jar_path in jar_path_list]
+    jar_file_list[0].writestr("standin/Main.class", main_class(class_count))
+    for class_number in range(class_count):
+        jar_file_list[class_number % len(jar_file_list)].writestr("standin/C" + str(class_number) + ".class", helper_class(class_number, 8))
+    for jar_file in jar_file_list:
+        jar_file.close()
+    library_list = list()
+    for library_number in range(library_count):
+        library_id = "standin:library" + str(library_number) + ":1.0"
+        launcher_obj.LibraryManager.add_local(library_id, False, [jar_path_list[library_number + 1]], ["standin", "library" + str(library_number), "1.0", "library" + str(library_number) + "-1.0.jar"])
+        library_list.append({"name": library_id})
+    version_json = {"id": "standin", "minimumLauncherVersion": 14, "mainClass": "standin.Main", "assets": "standin", "minecraftArguments": "--gameDir ${game_directory}", "libraries": library_list}
+    version_json_path = os.path.join(work_directory, "standin.json")
+    FileTools.write_json(version_json_path, version_json)
+    launcher_obj.BinaryManager.install_custom("standin", jar_path_list[0], version_json_path)
+    FileTools.write_json(str(launcher_obj.AssetsManager.BASE_PATH.joinpath("indexes", "standin.json")), {"objects": dict()})
+
+def launch(profile_instance):
+    '''
+    Launches the stand-in and returns the milliseconds until it printed "ready", after waiting for it to exit
+    '''
+    start_time = time.perf_counter()
+    profile_instance.launch_version("standin", "custom")
+    ready_time = None
+    for output_line in profile_instance.game_process.stdout:
+        if output_line.strip() == "ready" and ready_time == None:
+            ready_time = time.perf_counter()
+    if not profile_instance.game_process.wait() == 0 or ready_time == None:
+        raise Exception("The stand-in game failed with exit code " + str(profile_instance.game_process.returncode))
+    return (ready_time - start_time) * 1000
+
+def time_launches(profile_instance, run_count):
+    duration_list = sorted([launch(profile_instance) for run_number in range(run_count)])
+    return duration_list
+
+def count_archived_classes(profile_instance, log_path):
+    '''
+    Launches the stand-in once with class loading logged, and returns the number of stand-in classes and how many came from an archive
+    '''
+    java_arguments = profile_instance.get_java_arguments()
+    profile_instance.set_java_arguments(java_arguments + " -Xlog:class+load=info:file=" + log_path)
+    launch(profile_instance)
+    profile_instance.set_java_arguments(java_arguments)
+    with open(log_path, mode="r") as log_file:
+        line_list = [current_line for current_line in log_file if " standin." in current_line]
+    os.remove(log_path)
+    return len(line_list), len([current_line for current_line in line_list if "shared objects file" in current_line])
+
+def run_archive_launches(launcher_obj, profile_instance, run_count, work_directory):
+    first_duration = launch(profile_instance) # Creates the archive
+    archive_paths = [os.path.join(directory_path, file_name) for directory_path, directory_list, file_list in os.walk(str(launcher_obj.ProfileManager.launch_plans.CDS_PATH)) for file_name in file_list]
+    print("  first launch, creating the archive: %.1f ms, archive %s" % (first_duration, ", ".join([os.path.basename(archive_path) + " (" + str(os.path.getsize(archive_path) // 1024) + " KiB)" for archive_path in archive_paths])))
+    print("  with the archive: " + common.format_runs(time_launches(profile_instance, run_count)))
+    class_count, archived_count = count_archived_classes(profile_instance, os.path.join(work_directory, "classes.log"))
+    print("  %d of %d stand-in classes were loaded from the archive" % (archived_count, class_count))
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmark of launching with a Class Data Sharing archive. Needs Java 13 or newer")
+    arg_parser.add_argument("--java", help="Java executable to use (default is the one YAMCL finds)", type=str, default=str())
+    arg_parser.add_argument("--classes", help="Number of stand-in classes (default is 4000)", type=int, default=4000)
+    arg_parser.add_argument("--libraries", help="Number of library jars the classes are spread over, besides the version jar (default is 3)", type=int, default=3)
+    arg_parser.add_argument("--runs", help="Number of timed launches for each case (default is 5)", type=int, default=5)
+    arg_returns = arg_parser.parse_args()
+
+    launcher_obj = common.new_launcher(java_command=arg_returns.java)
+    launch_plans = launcher_obj.ProfileManager.launch_plans
+    java_version = launcher_obj.PlatformTools.get_java_version()
+    if launcher_obj.PlatformTools.get_java_path() == None or java_version == None:
+        raise Exception("No usable Java was found. Use --java")
+    print("Java %d at %s, %d stand-in classes in %d jars" % (java_version, launcher_obj.PlatformTools.get_java_path(), arg_returns.classes, arg_returns.libraries + 1))
+    work_directory = tempfile.mkdtemp(prefix="yamcl-benchmark-")
+    install_stand_in(launcher_obj, arg_returns.classes, arg_returns.libraries, work_directory)
+    launcher_obj.ProfileManager.new("benchmark")
+    profile_instance = launcher_obj.ProfileManager.get_profile_instance("benchmark")
+
+    launch_plans.set_class_data_sharing(False)
+    print("without Class Data Sharing archive:")
+    print("  " + common.format_runs(time_launches(profile_instance, arg_returns.runs)))
+    launch_plans.set_class_data_sharing(True)
+    print("with the archive, Java %d flags: %s" % (java_version, " ".join(launch_plans.get_class_data_arguments(launch_plans.get_plan("standin", "custom")))))
+    run_archive_launches(launcher_obj, profile_instance, arg_returns.runs, work_directory)
+
+    if java_version >= launch_plans.CDS_AUTO_VERSION:
+        # Newer Java also accepts the flags used for Java 13 to 18, so that path is checked here too
+        launch_plans.discard_version("standin", "custom")
+        launcher_obj.PlatformTools.java_version = launch_plans.CDS_DYNAMIC_VERSION
+        print("with the archive, flags used for Java 13 to 18: %s" % " ".join(launch_plans.get_class_data_arguments(launch_plans.get_plan("standin", "custom"))))
+        run_archive_launches(launcher_obj, profile_instance, arg_returns.runs, work_directory)
+        launch_plans.discard_version("standin", "custom")
+        launcher_obj.PlatformTools.java_version = java_version
+
+    for classpath_mode in launch_plans.CLASSPATH_MODES:
+        launch_plans.set_classpath_mode(classpath_mode)
+        launch(profile_instance)
+        class_count, archived_count = count_archived_classes(profile_instance, os.path.join(work_directory, "classes.log"))
+        print("classpath mode %s: %d of %d stand-in classes loaded from the archive" % (classpath_mode, archived_count, class_count))
+    common.remove_launcher(launcher_obj)
+    FileTools.delete_and_clean(work_directory)
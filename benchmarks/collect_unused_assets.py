@@ -0,0 +1,92 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+# Times the removal of unused asset objects on synthetic overlapping indexes
+# The list based pass YAMCL used before is quadratic, so it is only run with --compare-old
+
+import argparse
+import hashlib
+import time
+
+import common
+from yamcl.tools import FileTools
+
+def create_objects(launcher_obj, object_count):
+    '''
+    Writes 'object_count' objects and four indexes that overlap and use the first 80% of them. Returns the index IDs
+    '''
+    objects_path = launcher_obj.AssetsManager.BASE_PATH.joinpath("objects")
+    hash_list = [hashlib.sha1(str(object_number).encode("UTF-8")).hexdigest() for object_number in range(object_count)]
+    for object_hash in hash_list:
+        object_path = objects_path.joinpath(object_hash[:2], object_hash)
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        object_path.write_bytes(b"x" * 100)
+    used_hash_list = hash_list[:object_count * 4 // 5]
+    index_size = len(used_hash_list) // 2
+    for index_number in range(3):
+        first_object = index_number * len(used_hash_list) // 4
+        object_dict = dict()
+        for object_number, object_hash in enumerate(used_hash_list[first_object:first_object + index_size]):
+            object_dict["sounds/" + str(object_number) + ".ogg"] = {"hash": object_hash, "size": 100}
+        FileTools.write_json(str(launcher_obj.AssetsManager.BASE_PATH.joinpath("indexes", "index" + str(index_number) + ".json")), {"objects": object_dict})
+    object_dict = dict()
+    for object_number, object_hash in enumerate(used_hash_list):
+        object_dict["sounds/" + str(object_number) + ".ogg"] = {"hash": object_hash, "size": 100}
+    FileTools.write_json(str(launcher_obj.AssetsManager.BASE_PATH.joinpath("indexes", "all.json")), {"objects": object_dict})
+    return ["index0", "index1", "index2", "all"]
+
+def old_remove_unused_objects(launcher_obj, asset_id_list):
+    '''
+    AssetsManager._remove_unused_objects as it was before it used hash sets
+    '''
+    base_path = launcher_obj.AssetsManager.BASE_PATH
+    used_hash_list = list()
+    for asset_id in asset_id_list:
+        current_assets = FileTools.read_json(str(base_path.joinpath("indexes", asset_id + ".json")))["objects"]
+        for resource in current_assets.keys():
+            current_hash = current_assets[resource]["hash"]
+            if not current_hash in used_hash_list:
+                used_hash_list.append(current_hash)
+    for prefix_hash_dir in base_path.joinpath("objects").iterdir():
+        for hash_file in prefix_hash_dir.iterdir():
+            if not hash_file.name in used_hash_list:
+                FileTools.delete_and_clean(str(hash_file))
+
+def count_objects(launcher_obj):
+    return sum(1 for object_path in launcher_obj.AssetsManager.BASE_PATH.joinpath("objects").glob("*/*"))
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmark of removing unused asset objects")
+    arg_parser.add_argument("--objects", help="Number of objects on disk (default is 50000). 20%% of them are unused", type=int, default=50000)
+    arg_parser.add_argument("--compare-old", help="Also time the list based pass used before. Takes minutes with 50000 objects", action="store_true")
+    arg_returns = arg_parser.parse_args()
+
+    launcher_obj = common.new_launcher()
+    asset_id_list = create_objects(launcher_obj, arg_returns.objects)
+    start_time = time.perf_counter()
+    unused_info = launcher_obj.AssetsManager.get_reclaimable_objects()
+    print("dry run:     %.2f s, %d unused objects, %d bytes reclaimable" % (time.perf_counter() - start_time, unused_info["count"], unused_info["bytes"]))
+    start_time = time.perf_counter()
+    launcher_obj.AssetsManager._remove_unused_objects(asset_id_list)
+    print("current:     %.2f s, %d objects left" % (time.perf_counter() - start_time, count_objects(launcher_obj)))
+    common.remove_launcher(launcher_obj)
+
+    if arg_returns.compare_old:
+        launcher_obj = common.new_launcher()
+        asset_id_list = create_objects(launcher_obj, arg_returns.objects)
+        start_time = time.perf_counter()
+        old_remove_unused_objects(launcher_obj, asset_id_list)
+        print("old (lists): %.2f s, %d objects left" % (time.perf_counter() - start_time, count_objects(launcher_obj)))
+        common.remove_launcher(launcher_obj)
@@ -0,0 +1,130 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+# Shared helpers for the benchmark scripts in this directory
+
+import hashlib
+import http.server
+import pathlib
+import shutil
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import yamcl.main
+from yamcl.globals import URL
+from yamcl.tools import JSONTools
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keeps connections alive like the real servers
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.request_count += 1
+        if self.server.delay > 0:
+            time.sleep(self.server.delay)
+        object_data = self.server.objects.get(self.path.lstrip("/"))
+        if object_data == None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(object_data)))
+        self.end_headers()
+        self.wfile.write(object_data)
+
+class StandInServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    '''
+    Local HTTP server standing in for the Mojang download servers
+    'objects' maps URL paths (without the leading slash) to their bytes, like "res/ab/ab12..." for an asset object
+    Every request waits 'delay' seconds first, to stand in for the network round trip
+    '''
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, delay=0.0):
+        super(StandInServer, self).__init__(("127.0.0.1", 0), StandInHandler)
+        self.objects = dict()
+        self.delay = delay
+        self.request_count = 0
+
+    def start(self):
+        '''
+        Serves in a background thread and points the YAMCL download URLs at this server
+        '''
+        server_thread = threading.Thread(target=self.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        base_url = "http://127.0.0.1:" + str(self.server_address[1]) + "/"
+        URL.RESOURCES = base_url + "res/"
+        URL.DOWNLOAD = base_url + "dl/"
+        URL.LIBRARIES = base_url + "lib/"
+        return base_url
+
+    def add_asset_index(self, asset_id, object_count, object_size=64, virtual=False):
+        '''
+        Serves a synthetic asset index 'asset_id' with 'object_count' distinct objects of 'object_size' bytes, and its objects
+        Returns the index
+        '''
+        object_dict = dict()
+        for object_number in range(object_count):
+            object_data = (asset_id + str(object_number)).encode("UTF-8").ljust(object_size, b".")[:object_size]
+            object_hash = hashlib.sha1(object_data).hexdigest()
+            self.objects["res/" + object_hash[:2] + "/" + object_hash] = object_data
+            object_dict["sounds/" + str(object_number) + ".ogg"] = {"hash": object_hash, "size": object_size}
+        asset_index = {"objects": object_dict}
+        if virtual:
+            asset_index["virtual"] = True
+        self.objects["dl/indexes/" + asset_id + ".json"] = JSONTools.serialize_json(asset_index).encode("UTF-8")
+        return asset_index
+
+def new_launcher(parent_directory=None, java_command=str()):
+    '''
+    Returns a started Launcher using a new empty data directory
+    '''
+    data_path = tempfile.mkdtemp(prefix="yamcl-benchmark-", dir=parent_directory)
+    launcher_obj = yamcl.main.Launcher()
+    launcher_obj.ROOT_PATH = pathlib.Path(data_path)
+    launcher_obj.create_skeleton_structure()
+    if not launcher_obj.startup(data_path=data_path, java_command=java_command) == "SUCCESS":
+        raise Exception("Could not start YAMCL in " + data_path)
+    return launcher_obj
+
+def remove_launcher(launcher_obj):
+    launcher_obj.shutdown()
+    shutil.rmtree(str(launcher_obj.ROOT_PATH), ignore_errors=True)
+
+def time_runs(run_function, run_count):
+    '''
+    Calls 'run_function' 'run_count' times and returns a sorted list of the durations in milliseconds
+    '''
+    duration_list = list()
+    for run_number in range(run_count):
+        start_time = time.perf_counter()
+        run_function()
+        duration_list.append((time.perf_counter() - start_time) * 1000)
+    duration_list.sort()
+    return duration_list
+
+def format_runs(duration_list):
+    return "min %.1f ms, median %.1f ms" % (duration_list[0], duration_list[len(duration_list) // 2])
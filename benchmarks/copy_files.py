@@ -0,0 +1,89 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+# Times FileTools.copy and FileTools.copy_object on a large file against the shutil based copies YAMCL used before
+# Old and current runs are interleaved, because the loopback download times drift between runs
+
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+
+import common
+from yamcl.globals import URL
+from yamcl.tools import FileTools
+
+def old_copy_object(source_object, destination_object, hasher=None):
+    '''
+    FileTools.copy_object as it was before
+    '''
+    if hasher == None:
+        shutil.copyfileobj(source_object, destination_object)
+        return
+    while True:
+        data_chunk = source_object.read(65536)
+        if len(data_chunk) == 0:
+            break
+        hasher.update(data_chunk)
+        destination_object.write(data_chunk)
+
+def download(copy_function, destination_path, hashed):
+    '''
+    Downloads the test file from the stand-in server with 'copy_function'
+    '''
+    url_object = URL("large", URL.RESOURCES).url_object()
+    with open(destination_path, mode="wb") as destination_file:
+        copy_function(url_object, destination_file, hashlib.sha1() if hashed else None)
+    url_object.close()
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmark of copying files and downloads")
+    arg_parser.add_argument("--size", help="Size of the test file in MiB (default is 100)", type=int, default=100)
+    arg_parser.add_argument("--runs", help="Number of times each copy is timed (default is 9)", type=int, default=9)
+    arg_parser.add_argument("--directory", help="Directory for the test files (default is the system temporary directory)", type=str, default=None)
+    arg_returns = arg_parser.parse_args()
+
+    work_directory = tempfile.mkdtemp(prefix="yamcl-benchmark-", dir=arg_returns.directory)
+    source_path = os.path.join(work_directory, "source")
+    test_data = os.urandom(arg_returns.size * 1048576)
+    with open(source_path, mode="wb") as source_file:
+        source_file.write(test_data)
+
+    print("file to file, %d MiB:" % arg_returns.size)
+    old_list = list()
+    current_list = list()
+    for run_number in range(arg_returns.runs):
+        old_list += common.time_runs(lambda: shutil.copy(source_path, os.path.join(work_directory, "old")), 1)
+        current_list += common.time_runs(lambda: FileTools.copy(source_path, os.path.join(work_directory, "current")), 1)
+    print("  old shutil.copy:  " + common.format_runs(sorted(old_list)))
+    print("  FileTools.copy:   " + common.format_runs(sorted(current_list)) + " (" + FileTools.copy_file(source_path, os.path.join(work_directory, "current")) + ")")
+
+    stand_in_server = common.StandInServer()
+    stand_in_server.start()
+    stand_in_server.objects["res/large"] = test_data
+    for hashed in [False, True]:
+        print("download over loopback HTTP, %d MiB%s:" % (arg_returns.size, ", hashed" if hashed else str()))
+        old_list = list()
+        current_list = list()
+        for run_number in range(arg_returns.runs):
+            old_list += common.time_runs(lambda: download(old_copy_object, os.path.join(work_directory, "old"), hashed), 1)
+            current_list += common.time_runs(lambda: download(FileTools.copy_object, os.path.join(work_directory, "current"), hashed), 1)
+        print("  old copy_object:  " + common.format_runs(sorted(old_list)))
+        print("  current:          " + common.format_runs(sorted(current_list)))
+    with open(os.path.join(work_directory, "current"), mode="rb") as current_file:
+        if not current_file.read() == test_data:
+            raise Exception("The downloaded file is different")
+    shutil.rmtree(work_directory)
@@ -0,0 +1,67 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+# Downloads a synthetic asset index from a local stand-in server with AssetsManager.download_missing
+# and compares it with the serial download YAMCL used before (a new urllib connection per object)
+
+import argparse
+import os
+import shutil
+import time
+import urllib.request
+
+import common
+from yamcl.globals import URL
+
+def serial_download(launcher_obj, asset_index):
+    '''
+    The asset download as it was before the worker pool
+    '''
+    for asset in asset_index["objects"].values():
+        asset_path = str(launcher_obj.AssetsManager.BASE_PATH.joinpath("objects", asset["hash"][:2], asset["hash"]))
+        os.makedirs(os.path.dirname(asset_path), exist_ok=True)
+        with urllib.request.urlopen(URL.RESOURCES + asset["hash"][:2] + "/" + asset["hash"]) as asset_response:
+            with open(asset_path, mode="wb") as asset_file:
+                shutil.copyfileobj(asset_response, asset_file)
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmark of downloading missing asset objects")
+    arg_parser.add_argument("--objects", help="Number of objects in the index (default is 10000)", type=int, default=10000)
+    arg_parser.add_argument("--workers", help="Comma separated worker counts to try (default is 1,8,32)", type=str, default="1,8,32")
+    arg_parser.add_argument("--delay", help="Seconds the server waits before each response, standing in for network latency (default is 0.002)", type=float, default=0.002)
+    arg_returns = arg_parser.parse_args()
+
+    stand_in_server = common.StandInServer(arg_returns.delay)
+    stand_in_server.start()
+    asset_index = stand_in_server.add_asset_index("benchmark", arg_returns.objects)
+
+    launcher_obj = common.new_launcher()
+    start_time = time.perf_counter()
+    serial_download(launcher_obj, asset_index)
+    duration = time.perf_counter() - start_time
+    print("serial urllib:  %d objects in %.2f s (%.0f objects/s)" % (arg_returns.objects, duration, arg_returns.objects / duration))
+    common.remove_launcher(launcher_obj)
+
+    for worker_count in [int(current_count) for current_count in arg_returns.workers.split(",")]:
+        launcher_obj = common.new_launcher()
+        launcher_obj.DownloadPool.set_worker_count(worker_count)
+        URL.connection_pool.set_host_limit(worker_count)
+        launcher_obj.AssetsManager.download_index("benchmark")
+        progress_list = list()
+        start_time = time.perf_counter()
+        download_counts = launcher_obj.AssetsManager.download_missing("benchmark", lambda status, fraction: progress_list.append(fraction))
+        duration = time.perf_counter() - start_time
+        print("%2d workers:     %d objects in %.2f s (%.0f objects/s), %d failed, last progress %.2f" % (worker_count, download_counts["downloaded"], duration, download_counts["downloaded"] / duration, download_counts["failed"], progress_list[-1]))
+        common.remove_launcher(launcher_obj)
@@ -0,0 +1,100 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+# Times FileTools.extract_jar_files on a natives jar against the nested exclude loop YAMCL used before
+# Uses a generated jar unless --jar is given
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+
+import common
+from yamcl.tools import FileTools
+
+def create_natives_jar(jar_path, member_count, member_size):
+    '''
+    Writes a signed natives jar with 'member_count' native libraries of 'member_size' bytes in several directories
+    '''
+    random.seed(1)
+    with zipfile.ZipFile(jar_path, mode="w", compression=zipfile.ZIP_DEFLATED) as jar_file:
+        jar_file.writestr("META-INF/MANIFEST.MF", "Manifest-Version: 1.0\r\n")
+        for signature_number in range(20):
+            jar_file.writestr("META-INF/SIGNER" + str(signature_number) + ".SF", "Signature-Version: 1.0\r\n")
+        for member_number in range(member_count):
+            member_directory = random.choice(["linux", "linux/x64", "util", "opengl", "openal"])
+            jar_file.writestr("org/lwjgl/" + member_directory + "/liblwjgl" + str(member_number) + ".so", os.urandom(member_size))
+
+def old_filter(jar_file_list, exclude_list):
+    '''
+    The exclude filter of FileTools.extract_jar_files as it was before. It returns members once per exclude that does not match them
+    '''
+    good_list = list()
+    for exclude in exclude_list:
+        for member in jar_file_list:
+            if not member.startswith(exclude):
+                good_list.append(member)
+    return good_list
+
+def old_extract_jar_files(jar_object, destination_dir, exclude_list):
+    jar_file_list = jar_object.namelist()
+    if len(exclude_list) > 0:
+        jar_file_list = old_filter(jar_file_list, exclude_list)
+    for member in jar_file_list:
+        if not FileTools._is_member_extracted(jar_object.getinfo(member), destination_dir):
+            jar_object.extract(member, destination_dir)
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmark of extracting a natives jar")
+    arg_parser.add_argument("--jar", help="Natives jar to extract instead of a generated one", type=str, default=str())
+    arg_parser.add_argument("--members", help="Number of native libraries in the generated jar (default is 4000)", type=int, default=4000)
+    arg_parser.add_argument("--member-size", help="Size in bytes of each native library in the generated jar (default is 4096)", type=int, default=4096)
+    arg_parser.add_argument("--exclude", help="Comma separated exclude prefixes (default is META-INF/,org/lwjgl/util/,org/lwjgl/openal/)", type=str, default="META-INF/,org/lwjgl/util/,org/lwjgl/openal/")
+    arg_parser.add_argument("--runs", help="Number of times each step is timed (default is 5)", type=int, default=5)
+    arg_returns = arg_parser.parse_args()
+
+    work_directory = tempfile.mkdtemp(prefix="yamcl-benchmark-")
+    jar_path = arg_returns.jar
+    if len(jar_path) == 0:
+        jar_path = os.path.join(work_directory, "natives.jar")
+        create_natives_jar(jar_path, arg_returns.members, arg_returns.member_size)
+    exclude_list = arg_returns.exclude.split(",")
+
+    with zipfile.ZipFile(jar_path) as jar_object:
+        member_list = jar_object.namelist()
+        expected_list = [member for member in member_list if not any(member.startswith(exclude) for exclude in exclude_list)]
+        print("%s: %d members, %d bytes, %d kept after excluding %s" % (os.path.basename(jar_path), len(member_list), os.path.getsize(jar_path), len(expected_list), exclude_list))
+        old_list = old_filter(member_list, exclude_list)
+        print("old filter returned %d members (%d distinct)" % (len(old_list), len(set(old_list))))
+        print("filter only:")
+        print("  old:     " + common.format_runs(common.time_runs(lambda: old_filter(member_list, exclude_list), arg_returns.runs)))
+        print("  current: " + common.format_runs(common.time_runs(lambda: FileTools._exclude_members(member_list, exclude_list), arg_returns.runs)))
+        if not FileTools._exclude_members(member_list, exclude_list) == expected_list:
+            raise Exception("The current filter returned the wrong members")
+        for label, extract_function in [("old", old_extract_jar_files), ("current", FileTools.extract_jar_files)]:
+            cold_list = list()
+            warm_list = list()
+            for run_number in range(arg_returns.runs):
+                destination_dir = os.path.join(work_directory, label + str(run_number))
+                cold_list += common.time_runs(lambda: extract_function(jar_object, destination_dir, exclude_list), 1)
+                warm_list += common.time_runs(lambda: extract_function(jar_object, destination_dir, exclude_list), 1)
+                extracted_count = sum(len(file_list) for directory_path, directory_list, file_list in os.walk(destination_dir))
+                shutil.rmtree(destination_dir)
+            cold_list.sort()
+            warm_list.sort()
+            print("extract %-7s new directory: %s; already extracted: %s; %d files written" % (label + ",", common.format_runs(cold_list), common.format_runs(warm_list), extracted_count))
+    shutil.rmtree(work_directory)
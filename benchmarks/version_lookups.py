@@ -0,0 +1,79 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+# Times the version checks made when the official versions list is populated,
+# against the linear scans YAMCL used before the version lookup dicts
+
+import argparse
+
+import common
+import yamcl.managers
+from yamcl.tools import FileTools
+
+def old_version_exists(binary_manager, version_id, version_type):
+    '''
+    BinaryManager.version_exists as it was before, scanning the index
+    '''
+    for current_version in binary_manager.index:
+        if current_version["name"] == version_id and current_version["type"] == version_type:
+            return True
+    return False
+
+def old_official_exists(versions_json, version_id):
+    '''
+    VersionsListManager.version_exists as it was before, scanning the versions list
+    '''
+    for current_version in versions_json["versions"]:
+        if current_version["id"] == version_id:
+            return True
+    return False
+
+def populate_official(launcher_obj, exists_function):
+    '''
+    The checks of MainGUI._populate_official_versions_treeview. Returns the number of versions that would be listed
+    '''
+    listed_count = 0
+    for current_version in launcher_obj.VersionsListManager.get_versions()["versions"]:
+        if not exists_function(current_version["id"], "vanilla"):
+            listed_count += 1
+    return listed_count
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmark of looking up installed and official versions")
+    arg_parser.add_argument("--official", help="Number of official versions (default is 800)", type=int, default=800)
+    arg_parser.add_argument("--installed", help="Number of installed versions (default is 400)", type=int, default=400)
+    arg_parser.add_argument("--runs", help="Number of times each check is timed (default is 20)", type=int, default=20)
+    arg_returns = arg_parser.parse_args()
+
+    launcher_obj = common.new_launcher()
+    versions_json = {"latest": {"release": "1.0", "snapshot": "1.0"}, "versions": list()}
+    for version_number in range(arg_returns.official):
+        versions_json["versions"].append({"id": "1." + str(version_number), "type": "release"})
+    FileTools.write_json(launcher_obj.VersionsListManager.versions_path, versions_json)
+    launcher_obj.VersionsListManager = yamcl.managers.VersionsListManager(launcher_obj) # Loads the versions list written above
+    with launcher_obj.BinaryManager.batch():
+        for version_number in range(arg_returns.installed):
+            launcher_obj.BinaryManager._add_version_listing("1." + str(version_number * 2), "vanilla")
+    binary_manager = launcher_obj.BinaryManager
+
+    print("populate official list, %d official and %d installed versions:" % (arg_returns.official, arg_returns.installed))
+    print("  old:     " + common.format_runs(common.time_runs(lambda: populate_official(launcher_obj, lambda version_id, version_type: old_version_exists(binary_manager, version_id, version_type)), arg_returns.runs)))
+    print("  current: " + common.format_runs(common.time_runs(lambda: populate_official(launcher_obj, binary_manager.version_exists), arg_returns.runs)))
+    print("check every official version against the versions list:")
+    print("  old:     " + common.format_runs(common.time_runs(lambda: [old_official_exists(versions_json, current_version["id"]) for current_version in versions_json["versions"]], arg_returns.runs)))
+    print("  current: " + common.format_runs(common.time_runs(lambda: [launcher_obj.VersionsListManager.version_exists(current_version["id"]) for current_version in versions_json["versions"]], arg_returns.runs)))
+    if not populate_official(launcher_obj, binary_manager.version_exists) == populate_official(launcher_obj, lambda version_id, version_type: old_version_exists(binary_manager, version_id, version_type)):
+        raise Exception("The lookups disagree")
+    common.remove_launcher(launcher_obj)
@@ -334,12 +334,18 @@ class ProfileInstanceTab(QtGui.QWidget):
         action_buttons_layout.addStretch()
         action_buttons_layout.addWidget(show_game_output_button)
 
+        self.resources_label = QtGui.QLabel("Game is not running")
+        self.resources_timer = QtCore.QTimer(self)
+        self.resources_timer.timeout.connect(self._update_resources)
+        self.resources_timer.start(1000)
+
         main_layout = QtGui.QVBoxLayout()
         main_layout.addWidget(notes_groupbox)
         main_layout.addLayout(java_args_layout)
         main_layout.addWidget(specify_version_groupbox)
         main_layout.addWidget(launch_game_button)
         main_layout.addLayout(action_buttons_layout)
+        main_layout.addWidget(self.resources_label)
         self.setLayout(main_layout)
 
         self.type_combobox.setCurrentIndex(self.type_combobox.findText(self.ProfileInstance.get_last_version()["type"]))
@@ -399,6 +405,20 @@ class ProfileInstanceTab(QtGui.QWidget):
         self.ProfileInstance.launch_version(self._selected_id(), self._selected_type())
         self.console_output = ConsoleOutput.GameOutput(self.ProfileInstance.get_name(), self.ProfileInstance.get_output_object(), self)
 
+    def _update_resources(self):
+        resource_samples = self.ProfileInstance.get_resource_samples()
+        if not self.ProfileInstance.check_game_running():
+            self.resources_label.setText("Game is not running")
+        elif len(resource_samples) == 0:
+            self.resources_label.setText("Game is running")
+        else:
+            latest_sample = resource_samples[-1]
+            resources_text = "Memory: " + str(round(latest_sample["rss_bytes"] / 1048576)) + " MB"
+            if not latest_sample["cpu_percent"] == None:
+                resources_text += "    CPU: " + str(round(latest_sample["cpu_percent"])) + "%"
+            resources_text += "    Threads: " + str(latest_sample["threads"]) + "    Open files: " + str(latest_sample["fds"])
+            self.resources_label.setText(resources_text)
+
     def _open_notes_editor(self):
         notes_editor = NotesEditor.NotesEditor(self.ProfileInstance.get_name(), self.ProfileInstance.get_notes(), self.set_new_notes, self.cancel_new_notes, parent=self)
         notes_editor.show()
@@ -510,6 +530,9 @@ class VersionsManagerTab(QtGui.QWidget):
         self.rename_button = QtGui.QPushButton("Rename")
         self.rename_button.clicked.connect(self._rename_custom_version)
         self.rename_button.setEnabled(False)
+        self.download_missing_button = QtGui.QPushButton("Download Missing Files")
+        self.download_missing_button.clicked.connect(self._download_missing_files)
+        self.download_missing_button.setEnabled(False)
         self.delete_button = QtGui.QPushButton("Delete")
         self.delete_button.clicked.connect(self._delete_version)
         self.delete_button.setEnabled(False)
@@ -519,8 +542,11 @@ class VersionsManagerTab(QtGui.QWidget):
         manage_versions_buttonlayout.addWidget(self.edit_metadata_button)
         manage_versions_buttonlayout.addWidget(self.open_directory_button)
         manage_versions_buttonlayout.addWidget(self.rename_button)
+        manage_versions_buttonlayout.addWidget(self.download_missing_button)
         manage_versions_buttonlayout.addWidget(self.delete_button)
         manage_versions_buttonlayout.addStretch()
+        self.blob_statistics_label = QtGui.QLabel()
+        manage_versions_buttonlayout.addWidget(self.blob_statistics_label)
         manage_versions_layout = QtGui.QHBoxLayout()
         manage_versions_layout.addWidget(self.manage_versions_treeview)
         manage_versions_layout.addLayout(manage_versions_buttonlayout)
@@ -557,6 +583,8 @@ class VersionsManagerTab(QtGui.QWidget):
         self.progress_dialog.setAutoClose(False)
         
         self._populate_manage_versions_treeview()
+        if not self.Launcher.VersionsListManager.get_versions() == None:
+            self._load_official_versions()
 
     def _populate_official_versions_treeview(self):
         self.install_selected_button.setEnabled(False)
@@ -588,11 +616,13 @@ class VersionsManagerTab(QtGui.QWidget):
         self.index_refresh_button.setText("Downloading...")
         QtGui.QApplication.processEvents()
         first_time = self.Launcher.VersionsListManager.get_versions() == None
-        self.Launcher.VersionsListManager.download_versions()
+        download_status = self.Launcher.VersionsListManager.download_versions()
         self._load_official_versions()
         self.index_refresh_button.setEnabled(True)
         self.index_refresh_button.setText(orig_button_text)
-        if not first_time:
+        if download_status == "OFFLINE":
+            QtGui.QMessageBox.warning(self, "YAMCL: Download Available Versions Index", "The versions index could not be downloaded. The last downloaded index is shown instead.")
+        elif not first_time:
             QtGui.QMessageBox.information(self, "YAMCL: Download Available Versions Index", "The latest versions index has been downloaded.")
 
     def _official_versions_item_change(self, index, previous):
@@ -622,17 +652,21 @@ class VersionsManagerTab(QtGui.QWidget):
                     return
             self.Launcher.LibraryManager.download_missing(binary_metadata.get_library_metadatas(), self.progress_dialog_events.status_update)
             self.Launcher.AssetsManager.download_index(binary_metadata.get_assets_id())
-            self.Launcher.AssetsManager.download_missing(binary_metadata.get_assets_id(), self.progress_dialog_events.status_update)
+            asset_counts = self.Launcher.AssetsManager.download_missing(binary_metadata.get_assets_id(), self.progress_dialog_events.status_update)
             self.progress_dialog_events.close_dialog()
             self._load_official_versions()
             self._populate_manage_versions_treeview()
-            QtGui.QMessageBox.information(self, "YAMCL: Installed " + vanilla_id, "Official version " + vanilla_id + " installed successfully")
+            if asset_counts["failed"] > 0:
+                QtGui.QMessageBox.warning(self, "YAMCL: Missing Assets", "Official version " + vanilla_id + " was installed, but " + str(asset_counts["failed"]) + " of " + str(asset_counts["downloaded"] + asset_counts["failed"]) + " assets could not be downloaded correctly. Select " + vanilla_id + " under Currently Installed Versions and click Download Missing Files to retry them.")
+            else:
+                QtGui.QMessageBox.information(self, "YAMCL: Installed " + vanilla_id, "Official version " + vanilla_id + " installed successfully")
 
     def _populate_manage_versions_treeview(self):
         self.edit_notes_button.setEnabled(False)
         self.edit_metadata_button.setEnabled(False)
         self.rename_button.setEnabled(False)
         self.open_directory_button.setEnabled(False)
+        self.download_missing_button.setEnabled(False)
         self.delete_button.setEnabled(False)
         self.manage_versions_treeview.model().clear()
         self.manage_versions_treeview.model().setHorizontalHeaderLabels(["Currently Installed Versions"])
@@ -644,6 +678,8 @@ class VersionsManagerTab(QtGui.QWidget):
                 version_item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
                 type_item.appendRow(version_item)
             self.manage_versions_treeview.model().invisibleRootItem().appendRow(type_item)
+        blob_info = self.Launcher.BlobStore.get_statistics()
+        self.blob_statistics_label.setText("Jars: " + str(blob_info["count"]) + " (" + str(round(blob_info["bytes"] / 1048576)) + " MB)\nSaved by sharing: " + str(round(blob_info["saved_bytes"] / 1048576)) + " MB")
 
     def _manage_versions_item_change(self, index, previous):
         new_state = False
@@ -658,6 +694,7 @@ class VersionsManagerTab(QtGui.QWidget):
         self.edit_metadata_button.setEnabled(is_custom and new_state)
         self.rename_button.setEnabled(is_custom and new_state)
         self.open_directory_button.setEnabled(new_state)
+        self.download_missing_button.setEnabled(new_state)
         self.delete_button.setEnabled(new_state)
 
     def _edit_version_notes(self):
@@ -698,6 +735,23 @@ class VersionsManagerTab(QtGui.QWidget):
                     self._populate_manage_versions_treeview()
                     break
 
+    def _download_missing_files(self):
+        version_text = self.manage_versions_treeview.model().itemFromIndex(self.manage_versions_treeview.currentIndex()).text()
+        type_text = self.manage_versions_treeview.model().itemFromIndex(self.manage_versions_treeview.currentIndex()).parent().text()
+        binary_metadata = self.Launcher.BinaryManager.get_binary_metadata(version_text, type_text)
+        self.progress_dialog_events.set_window_title("Downloading missing files for " + version_text)
+        self.progress_dialog_events.show_dialog()
+        QtGui.QApplication.processEvents()
+        self.Launcher.LibraryManager.download_missing(binary_metadata.get_library_metadatas(), self.progress_dialog_events.status_update)
+        if not self.Launcher.AssetsManager.has_index(binary_metadata.get_assets_id()):
+            self.Launcher.AssetsManager.download_index(binary_metadata.get_assets_id())
+        asset_counts = self.Launcher.AssetsManager.download_missing(binary_metadata.get_assets_id(), self.progress_dialog_events.status_update)
+        self.progress_dialog_events.close_dialog()
+        if asset_counts["failed"] > 0:
+            QtGui.QMessageBox.warning(self, "YAMCL: Missing Assets", str(asset_counts["failed"]) + " of " + str(asset_counts["downloaded"] + asset_counts["failed"]) + " missing assets still could not be downloaded correctly.")
+        else:
+            QtGui.QMessageBox.information(self, "YAMCL: Downloaded Missing Files", "All files of " + version_text + " are downloaded. " + str(asset_counts["downloaded"]) + " missing assets were downloaded.")
+
     def _delete_version(self):
         version_text = self.manage_versions_treeview.model().itemFromIndex(self.manage_versions_treeview.currentIndex()).text()
         type_text = self.manage_versions_treeview.model().itemFromIndex(self.manage_versions_treeview.currentIndex()).parent().text()
@@ -706,8 +760,10 @@ class VersionsManagerTab(QtGui.QWidget):
             self.Launcher.BinaryManager.delete(version_text, type_text)
             self._populate_manage_versions_treeview()
             binary_metadata_list = self.Launcher.BinaryManager.get_binary_metadata_list(exclude={type_text: [version_text]})
-            for library_id in self.Launcher.LibraryManager.get_unused_libraries(binary_metadata_list):
-                self.Launcher.LibraryManager.delete(library_id)
+            with self.Launcher.LibraryManager.batch():
+                for library_id in self.Launcher.LibraryManager.get_unused_libraries(binary_metadata_list):
+                    self.Launcher.LibraryManager.delete(library_id)
+            self.Launcher.BlobStore.remove_unused()
             for asset_id in self.Launcher.AssetsManager.get_unused(binary_metadata_list):
                 self.Launcher.AssetsManager.delete(asset_id)
             if type_text == "vanilla" and not self.Launcher.VersionsListManager.get_versions() == None:
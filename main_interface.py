@@ -20,6 +20,7 @@ import pathlib
 from PySide import QtCore, QtGui
 
 import yamcl.main
+from yamcl.globals import URL
 
 import graphical_interface.MainGUI
 
@@ -56,7 +57,12 @@ if __name__ == '__main__':
     arg_parser.add_argument("--data-path", help="Override path to YAMCL's data directory", type=str, default=str())
     arg_parser.add_argument("--java-path", help="Override the Java executable to use", type=str, default=str())
     arg_parser.add_argument("--disable-library-download-exclusive", help="Disables the downloading of libraries for the current platform only (default is enabled)", action="store_false", dest="library_download_exclusive")
-    arg_parser.set_defaults(library_download_exclusive=True)
+    arg_parser.add_argument("--download-threads", help="Number of files to download at the same time (default is 8)", type=int, default=8)
+    arg_parser.add_argument("--disable-class-data-sharing", help="Do not create or use a Class Data Sharing archive for each version (default is enabled on Java 13 and newer)", action="store_false", dest="class_data_sharing")
+    arg_parser.add_argument("--classpath-mode", help="How the classpath is passed to Java: 'argument', 'argfile' (Java 9 and newer) or 'jar' (a jar whose manifest lists the libraries). Default is 'argument'", choices=["argument", "argfile", "jar"], default="argument")
+    arg_parser.add_argument("--sample-interval", help="Seconds between samples of the memory and CPU use of running games (default is 2)", type=float, default=2.0)
+    arg_parser.add_argument("--use-catalog", help="Move the library, version and profile indexes into an SQLite catalog (kept for later runs)", action="store_true")
+    arg_parser.set_defaults(library_download_exclusive=True, class_data_sharing=True)
     arg_returns = arg_parser.parse_args()
 
     app = QtGui.QApplication(sys.argv)
@@ -68,7 +74,7 @@ if __name__ == '__main__':
     main_launcher = yamcl.main.Launcher()
     startup_status = None
     while not startup_status == "SUCCESS":
-        startup_status = main_launcher.startup(data_path=arg_returns.data_path, java_command=arg_returns.java_path)
+        startup_status = main_launcher.startup(data_path=arg_returns.data_path, java_command=arg_returns.java_path, use_catalog=arg_returns.use_catalog)
         if startup_status == "FAIL_DATACORRUPT":
             clicked_button = QtGui.QMessageBox.critical(splash_screen, "YAMCL Data Error", "Your YAMCL data at " + str(main_launcher.ROOT_PATH) + " is missing or corrupt.\nWould you like to initialize the directory? Click Cancel to exit YAMCL.", QtGui.QMessageBox.Yes | QtGui.QMessageBox.Cancel)
             if clicked_button == QtGui.QMessageBox.Yes:
@@ -76,7 +82,16 @@ if __name__ == '__main__':
             else:
                 sys.exit()
 
+    if not main_launcher.BlobStore.is_imported():
+        splash_screen.showMessage("Adding installed jars to the blob store...")
+        app.processEvents()
+        main_launcher.BlobStore.add_existing()
     main_launcher.LibraryManager.set_download_exclusive(arg_returns.library_download_exclusive)
+    main_launcher.DownloadPool.set_worker_count(arg_returns.download_threads)
+    main_launcher.ProfileManager.launch_plans.set_class_data_sharing(arg_returns.class_data_sharing)
+    main_launcher.ProfileManager.launch_plans.set_classpath_mode(arg_returns.classpath_mode)
+    main_launcher.GameSupervisor.set_sample_interval(arg_returns.sample_interval)
+    URL.connection_pool.set_host_limit(arg_returns.download_threads)
     if main_launcher.PlatformTools.get_java_path() == None:
         QtGui.QMessageBox.critical(splash_screen, "YAMCL: Java Error", "YAMCL was not able to find Java on your system, or your specified Java path is not valid. You will not be able to launch the game.", QtGui.QMessageBox.Ok)
     main_gui = graphical_interface.MainGUI.MainGUI(main_launcher)
@@ -13,8 +13,9 @@ You should have received a copy of the GNU General Public License
 along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
 '''
 
-from yamcl.tools import FileTools
+from yamcl.tools import FileTools, IndexStore
 from yamcl.globals import URL
+from yamcl.network import NetworkTools
 import yamcl.libraries
 
 class BinaryManager:
@@ -22,23 +23,42 @@ class BinaryManager:
         self.Launcher = launcher_obj
         self.BASE_PATH = self.Launcher.ROOT_PATH.joinpath("bin")
 
-        self.index_path = str(self.BASE_PATH.joinpath("index.json"))
-        self.index = FileTools.read_json(self.index_path)
+        if self.Launcher.Catalog == None:
+            self.index_store = IndexStore(str(self.BASE_PATH.joinpath("index.json")))
+        else:
+            self.index_store = self.Launcher.Catalog.get_store("binaries")
+        self.index = self.index_store.load()
+        self.version_lookup = dict() # Maps (name, type) to the listing in self.index
+        for current_version in self.index:
+            self.version_lookup[(current_version["name"], current_version["type"])] = current_version
 
     def _flush_index(self):
-        FileTools.write_json(self.index_path, self.index)
+        self.index_store.save(self.index)
 
-    def _get_version_index(self, version_id, version_type):
-        version_count = 0
-        for current_version in self.index:
-            if current_version["name"] == version_id and current_version["type"] == version_type:
-                return version_count
-            else:
-                version_count += 1
-        return -1
+    def batch(self):
+        '''
+        Returns a context manager that writes the binary index once for all changes made inside it
+        '''
+        return self.index_store.batch()
+
+    def _get_version_listing(self, version_id, version_type):
+        '''
+        Returns the index listing of version 'version_id' of type 'version_type', or None if it does not exist
+        '''
+        return self.version_lookup.get((version_id, version_type))
+
+    def _add_version_listing(self, version_id, version_type):
+        current_listing = dict()
+        current_listing["type"] = version_type
+        current_listing["name"] = version_id
+
+        self.index.append(current_listing)
+        self.version_lookup[(version_id, version_type)] = current_listing
+
+        self._flush_index()
 
     def version_exists(self, version_id, version_type):
-        return self._get_version_index(version_id, version_type) > -1
+        return (version_id, version_type) in self.version_lookup
 
     def get_installed_versions(self):
         installed_versions = dict()
@@ -83,16 +103,12 @@ class BinaryManager:
             raise Exception("Version " + version_id + " already exists") # TODO: More appropriate exception
         paths_dict = self.get_paths(version_id, "vanilla")
 
-        FileTools.write_object(paths_dict["jar"], URL(["versions", version_id, version_id + ".jar"], URL.DOWNLOAD).url_object())
-        FileTools.write_object(paths_dict["json"], URL(["versions", version_id, version_id + ".json"], URL.DOWNLOAD).url_object())
-
-        current_listing = dict()
-        current_listing["type"] = "vanilla"
-        current_listing["name"] = version_id
-
-        self.index.append(current_listing)
+        for file_type in ["jar", "json"]:
+            if not NetworkTools.download_file(URL(["versions", version_id, version_id + "." + file_type], URL.DOWNLOAD), paths_dict[file_type])[0]:
+                raise Exception("Failed to download the " + file_type + " of version " + version_id) # TODO: More appropriate exception
+        self.Launcher.BlobStore.add(paths_dict["jar"])
 
-        self._flush_index()
+        self._add_version_listing(version_id, "vanilla")
 
     def install_custom(self, version_id, version_jar, version_json):
         if self.version_exists(version_id, "custom"):
@@ -100,55 +116,46 @@ class BinaryManager:
         paths_dict = self.get_paths(version_id, "custom")
         FileTools.copy(version_jar, paths_dict["jar"])
         FileTools.copy(version_json, paths_dict["json"])
+        self.Launcher.BlobStore.add(paths_dict["jar"])
 
-        current_listing = dict()
-        current_listing["type"] = "custom"
-        current_listing["name"] = version_id
-
-        self.index.append(current_listing)
-
-        self._flush_index()
+        self._add_version_listing(version_id, "custom")
 
     def _clone_version(self, orig_id, orig_type, clone_id, clone_type):
+        '''
+        Copies version 'orig_id' to 'clone_id' without duplicating data where the filesystem allows it
+        Returns a dictionary with the method used for the "jar" and the "json" (see BlobStore.clone and FileTools.clone_file)
+        The json is never hard linked, since users edit it in place
+        '''
         orig_paths = self.get_paths(orig_id, orig_type)
         clone_paths = self.get_paths(clone_id, clone_type)
-        FileTools.copy(orig_paths["jar"], clone_paths["jar"])
-        FileTools.copy(orig_paths["json"], clone_paths["json"])
+        clone_methods = dict()
+        clone_methods["jar"] = self.Launcher.BlobStore.clone(orig_paths["jar"], clone_paths["jar"])
+        clone_methods["json"] = FileTools.clone_file(orig_paths["json"], clone_paths["json"])
 
-        current_listing = dict()
-        current_listing["type"] = clone_type
-        current_listing["name"] = clone_id
-
-        self.index.append(current_listing)
-
-        self._flush_index()
+        self._add_version_listing(clone_id, clone_type)
+        return clone_methods
 
     def custom_from_vanilla(self, vanilla_id, custom_id):
         if self.version_exists(custom_id, "custom"):
             raise Exception("Custom version already exists") # TODO: More appropriate exception
         if not self.version_exists(vanilla_id, "vanilla"):
             raise Exception("Vanilla version does not exist") # TODO: More appropriate exception
-        self._clone_version(vanilla_id, "vanilla", custom_id, "custom")
+        return self._clone_version(vanilla_id, "vanilla", custom_id, "custom")
 
     def custom_from_custom(self, orig_id, clone_id):
         if self.version_exists(clone_id, "custom"):
             raise Exception("Custom version already exists") # TODO: More appropriate exception
         if not self.version_exists(orig_id, "custom"):
             raise Exception("Original custom version does not exist") # TODO: More appropriate exception
-        self._clone_version(orig_id, "custom", clone_id, "custom")
+        return self._clone_version(orig_id, "custom", clone_id, "custom")
 
     def delete(self, version_id, version_type):
         if not self.version_exists(version_id, version_type):
             raise Exception("Version does not exist") # TODO: More appropriate exception
-        index_count = 0
-        for current_version in self.index:
-            if current_version["type"] == version_type and current_version["name"] == version_id:
-                break
-            else:
-                index_count += 1
-        del self.index[index_count]
+        self.index.remove(self.version_lookup.pop((version_id, version_type)))
         self._flush_index()
         FileTools.delete_and_clean(str(self.get_paths(version_id, version_type)["directory"]))
+        self.Launcher.ProfileManager.launch_plans.discard_version(version_id, version_type)
 
     def rename(self, current_version_id, new_version_id):
         if not self.version_exists(current_version_id, "custom"):
@@ -161,21 +168,24 @@ class BinaryManager:
         for file_type in ["jar", "json"]:
             FileTools.move(old_id_paths[file_type], new_id_paths[file_type])
         FileTools.delete_and_clean(str(old_id_paths["directory"]))
-        index_listing = self.index[self._get_version_index(current_version_id, "custom")]
+        self.Launcher.ProfileManager.launch_plans.discard_version(current_version_id, "custom")
+        index_listing = self.version_lookup.pop((current_version_id, "custom"))
         index_listing["name"] = new_version_id
+        self.version_lookup[(new_version_id, "custom")] = index_listing
         self._flush_index()
 
     def get_notes(self, version_id):
         if not self.version_exists(version_id, "custom"):
             raise Exception("Custom version does not exist") # TODO: More appropriate exception
-        if not "notes" in self.index[self._get_version_index(version_id, "custom")]:
+        index_listing = self._get_version_listing(version_id, "custom")
+        if not "notes" in index_listing:
             return str()
-        return self.index[self._get_version_index(version_id, "custom")]["notes"]
+        return index_listing["notes"]
 
     def set_notes(self, version_id, new_notes):
         if not self.version_exists(version_id, "custom"):
             raise Exception("Custom version does not exist") # TODO: More appropriate exception
-        self.index[self._get_version_index(version_id, "custom")]["notes"] = new_notes
+        self._get_version_listing(version_id, "custom")["notes"] = new_notes
         self._flush_index()
 
 class BinaryMetadata:
@@ -221,15 +231,20 @@ class BinaryMetadata:
         self.json_info["minecraftArguments"] = new_args
 
     def generate_arguments(self, values_dict):
-        arguments_string = self.get_arguments()
-        arguments_list = arguments_string.split(" ")
-        for current_key in values_dict:
-            i = 0
-            while i < len(arguments_list):
-                if arguments_list[i] == "${" + current_key + "}":
-                    arguments_list[i] = values_dict[current_key]
-                i += 1
-        return arguments_list
+        return BinaryMetadata.fill_arguments(self.get_arguments().split(" "), values_dict)
+
+    @staticmethod
+    def fill_arguments(arguments_list, values_dict):
+        '''
+        Returns a copy of 'arguments_list' with every "${key}" argument replaced by the value of key in 'values_dict'
+        '''
+        filled_list = list()
+        for current_argument in arguments_list:
+            if current_argument.startswith("${") and current_argument.endswith("}") and current_argument[2:-1] in values_dict:
+                filled_list.append(values_dict[current_argument[2:-1]])
+            else:
+                filled_list.append(current_argument)
+        return filled_list
 
     def get_assets_id(self):
         if "assets" in self.json_info:
@@ -0,0 +1,149 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+import os
+import stat
+import sys
+
+from yamcl.tools import FileTools
+
+class BlobStore:
+    '''
+    Content-addressed store of jar files, named by their SHA-1 sum in the same layout as the asset objects
+    Library and version jars are hard links to their blob, so identical jars are only stored once
+    Blobs are made read-only, because writing to a jar in place would change every version sharing it
+    Jars are not linked to blobs on Windows, where a read-only file cannot be replaced or deleted and a writable one would not be protected
+    '''
+    def __init__(self, launcher_obj):
+        self.Launcher = launcher_obj
+        self.hard_links = not (sys.platform == "win32" or sys.platform == "cygwin")
+
+        self.BASE_PATH = self.Launcher.ROOT_PATH.joinpath("blobs")
+        self.imported_path = str(self.BASE_PATH.joinpath(".imported")) # Created once the jars installed before the blob store have been added
+
+    def _get_blob_path(self, file_hash):
+        return str(self.BASE_PATH.joinpath(file_hash[:2], file_hash))
+
+    def _make_read_only(self, file_path):
+        file_mode = stat.S_IMODE(os.stat(file_path).st_mode)
+        os.chmod(file_path, file_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+    def add(self, file_path, file_hash=None):
+        '''
+        Makes file 'file_path' a hard link to the blob with the same contents, adding the file as the blob if there is none
+        'file_hash' is the SHA-1 sum of the file, if it is already known
+        Returns True if the file is stored in a blob, False on Windows or if the filesystem does not support hard links
+        '''
+        if not self.hard_links:
+            return False
+        if file_hash == None:
+            file_hash = FileTools.hash_file(file_path).hexdigest()
+        blob_path = self._get_blob_path(file_hash)
+        try:
+            if FileTools.is_file(blob_path):
+                if not os.path.samefile(blob_path, file_path):
+                    temporary_path = file_path + ".blob"
+                    if FileTools.is_file(temporary_path):
+                        os.remove(temporary_path)
+                    os.link(blob_path, temporary_path)
+                    FileTools.replace(temporary_path, file_path)
+            else:
+                FileTools.add_missing_dirs(blob_path)
+                os.link(file_path, blob_path)
+                self._make_read_only(blob_path)
+        except OSError:
+            return False
+        return True
+
+    def clone(self, source_path, destination_path):
+        '''
+        Creates 'destination_path' with the contents of 'source_path' as cheaply as possible
+        Tries a reflink, which stays private to 'destination_path' when either file is written
+        Then tries a hard link to the blob of 'source_path', which is shared until the file is replaced (except on Windows)
+        Then copies the data with FileTools.copy_file
+        Returns the method that was used: "reflink", "hardlink", "copy_file_range", "sendfile" or "copy"
+        '''
+        FileTools.add_missing_dirs(destination_path)
+        if FileTools.reflink(source_path, destination_path):
+            return "reflink"
+        if self.hard_links and (os.stat(source_path).st_nlink > 1 or self.add(source_path)): # A jar with several links is already in a blob
+            try:
+                os.link(source_path, destination_path)
+                return "hardlink"
+            except OSError:
+                pass
+        return FileTools.copy_file(source_path, destination_path)
+
+    def _scan(self, remove_unused):
+        blob_info = dict()
+        blob_info["count"] = 0
+        blob_info["bytes"] = 0
+        blob_info["saved_bytes"] = 0
+        blob_info["unused_count"] = 0
+        blob_info["unused_bytes"] = 0
+        blobs_path = str(self.BASE_PATH)
+        if not FileTools.is_dir(blobs_path):
+            return blob_info
+        for prefix_hash_entry in os.scandir(blobs_path):
+            if not prefix_hash_entry.is_dir():
+                continue
+            unused_batch = list()
+            for hash_entry in os.scandir(prefix_hash_entry.path):
+                hash_stat = os.stat(hash_entry.path)
+                blob_info["count"] += 1
+                blob_info["bytes"] += hash_stat.st_size
+                if hash_stat.st_nlink > 2:
+                    blob_info["saved_bytes"] += hash_stat.st_size * (hash_stat.st_nlink - 2)
+                elif hash_stat.st_nlink == 1: # Only the blob itself is left
+                    unused_batch.append(hash_entry.path)
+                    blob_info["unused_bytes"] += hash_stat.st_size
+            blob_info["unused_count"] += len(unused_batch)
+            if remove_unused and len(unused_batch) > 0:
+                FileTools.delete_files_and_clean(unused_batch)
+        return blob_info
+
+    def get_statistics(self):
+        '''
+        Returns a dictionary with the number of blobs ("count"), their total size ("bytes"), the bytes saved by sharing them ("saved_bytes"),
+        and the number and size of blobs that no library or version uses anymore ("unused_count" and "unused_bytes")
+        '''
+        return self._scan(False)
+
+    def remove_unused(self):
+        '''
+        Removes blobs that no library or version uses anymore. Returns the same dictionary as get_statistics from before the removal
+        '''
+        return self._scan(True)
+
+    def is_imported(self):
+        return FileTools.is_file(self.imported_path)
+
+    def add_existing(self):
+        '''
+        Adds the jars of all installed libraries and versions to the store, and marks the store as imported
+        Returns the same dictionary as get_statistics
+        '''
+        for library_id in self.Launcher.LibraryManager.get_all_library_ids():
+            library_path = str(self.Launcher.LibraryManager.BASE_PATH.joinpath(self.Launcher.LibraryManager.get_library_path(library_id)))
+            if FileTools.is_file(library_path):
+                self.add(library_path)
+        installed_versions = self.Launcher.BinaryManager.get_installed_versions()
+        for version_type in installed_versions:
+            for version_id in installed_versions[version_type]:
+                jar_path = self.Launcher.BinaryManager.get_paths(version_id, version_type)["jar"]
+                if FileTools.is_file(jar_path):
+                    self.add(jar_path)
+        FileTools.write_string(self.imported_path, str())
+        return self.get_statistics()
@@ -0,0 +1,248 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+import os
+import sqlite3
+import threading
+import time
+
+from yamcl.tools import FileTools, IndexStore, JSONTools
+
+class Catalog:
+    '''
+    SQLite database that replaces the JSON index files of the library, binary and profile managers
+    It also records the asset objects that have been downloaded
+    '''
+    SCHEMA_VERSION = 1
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS libraries (id TEXT PRIMARY KEY, path TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS binaries (name TEXT NOT NULL, type TEXT NOT NULL, position INTEGER NOT NULL, notes TEXT, PRIMARY KEY (name, type))",
+        "CREATE TABLE IF NOT EXISTS profiles (name TEXT PRIMARY KEY, directory TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS asset_objects (hash TEXT PRIMARY KEY, size INTEGER NOT NULL, last_verified REAL)"
+    ]
+    JSON_INDEXES = [("libraries", ["lib", "index.json"]), ("binaries", ["bin", "index.json"]), ("profiles", ["profile", "index.json"])]
+
+    def __init__(self, root_path, catalog_path=None):
+        self.ROOT_PATH = root_path
+        self.catalog_path = catalog_path
+        if self.catalog_path == None:
+            self.catalog_path = str(self.ROOT_PATH.joinpath("catalog.sqlite"))
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(self.catalog_path, check_same_thread=False)
+        with self.lock:
+            if self.connection.execute("PRAGMA user_version").fetchone()[0] > Catalog.SCHEMA_VERSION:
+                raise Exception("Catalog " + self.catalog_path + " was created by a newer version of YAMCL") # TODO: More appropriate exception
+            with self.connection:
+                for current_statement in Catalog.SCHEMA:
+                    self.connection.execute(current_statement)
+                self.connection.execute("PRAGMA user_version = " + str(Catalog.SCHEMA_VERSION))
+        self.stores = dict()
+        self.stores["libraries"] = LibraryCatalogStore(self)
+        self.stores["binaries"] = BinaryCatalogStore(self)
+        self.stores["profiles"] = ProfileCatalogStore(self)
+
+    @staticmethod
+    def exists(root_path):
+        return FileTools.is_file(str(root_path.joinpath("catalog.sqlite")))
+
+    def get_store(self, table_name):
+        '''
+        Returns the index store for table 'table_name', which can be used in place of a JSON IndexStore
+        '''
+        return self.stores[table_name]
+
+    @staticmethod
+    def create(root_path):
+        '''
+        Creates the catalog from the JSON index files and returns it
+        The catalog is built in a temporary file and only moved into place once the migration has completed,
+        so a failed migration leaves no catalog behind and the JSON indexes stay in use
+        Each JSON index is renamed to "index.json.migrated" afterwards, so it is only migrated once
+        '''
+        catalog_path = str(root_path.joinpath("catalog.sqlite"))
+        temporary_path = catalog_path + ".tmp"
+        if FileTools.is_file(temporary_path):
+            os.remove(temporary_path)
+        new_catalog = Catalog(root_path, temporary_path)
+        try:
+            migrated_path_list = new_catalog._import_json()
+        except BaseException:
+            new_catalog.close()
+            os.remove(temporary_path)
+            raise
+        new_catalog.close()
+        FileTools.replace(temporary_path, catalog_path)
+        for index_path in migrated_path_list:
+            FileTools.replace(index_path, index_path + ".migrated")
+        return Catalog(root_path)
+
+    def _import_json(self):
+        '''
+        Copies the JSON index files and the asset objects on disk into the catalog in a single transaction
+        Returns a list of the paths of the JSON index files that were copied
+        '''
+        migrated_path_list = list()
+        with self.lock:
+            with self.connection:
+                for table_name, index_parts in Catalog.JSON_INDEXES:
+                    index_path = str(self.ROOT_PATH.joinpath(*index_parts))
+                    if FileTools.is_file(index_path):
+                        self.stores[table_name]._write_rows(self.connection, self.stores[table_name]._get_rows(FileTools.read_json(index_path)))
+                        migrated_path_list.append(index_path)
+                objects_path = str(self.ROOT_PATH.joinpath("assets", "objects"))
+                if FileTools.is_dir(objects_path):
+                    for prefix_hash_entry in os.scandir(objects_path):
+                        if prefix_hash_entry.is_dir():
+                            for hash_entry in os.scandir(prefix_hash_entry.path):
+                                self.connection.execute("INSERT OR IGNORE INTO asset_objects (hash, size) VALUES (?, ?)", (hash_entry.name, hash_entry.stat().st_size))
+        return migrated_path_list
+
+    def add_asset_objects(self, object_list):
+        '''
+        Records the objects in 'object_list', a list of tuples of the hash and size, as verified now
+        '''
+        verified_time = time.time()
+        with self.lock:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO asset_objects (hash, size, last_verified) VALUES (?, ?, ?)", [(object_hash, object_size, verified_time) for object_hash, object_size in object_list])
+
+    def remove_asset_objects(self, hash_list):
+        with self.lock:
+            with self.connection:
+                self.connection.executemany("DELETE FROM asset_objects WHERE hash = ?", [(object_hash,) for object_hash in hash_list])
+
+    def get_asset_object(self, object_hash):
+        '''
+        Returns a dictionary with the "size" and "last_verified" time of asset object 'object_hash', or None if it is not recorded
+        "last_verified" is None for objects that were found on disk during the migration
+        '''
+        with self.lock:
+            object_row = self.connection.execute("SELECT size, last_verified FROM asset_objects WHERE hash = ?", (object_hash,)).fetchone()
+        if object_row == None:
+            return None
+        object_info = dict()
+        object_info["size"] = object_row[0]
+        object_info["last_verified"] = object_row[1]
+        return object_info
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+class CatalogStore(IndexStore):
+    '''
+    Index store backed by a catalog table. Only the rows that changed since the last save are written
+    Its 'change_path' is a stamp file next to the catalog that is rewritten whenever the table changes,
+    since the catalog file itself also changes when other tables or the asset objects are written
+    '''
+    TABLE = None
+    KEY_COLUMNS = None
+    VALUE_COLUMNS = None
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.change_path = str(catalog.ROOT_PATH.joinpath("catalog." + self.TABLE + ".stamp"))
+        self.snapshot = None # Rows as they are in the table, keyed by the key columns
+        self._batch_depth = 0
+        self._pending_index = None
+
+    def _get_rows(self, index):
+        '''
+        Returns a dictionary mapping the key tuple of every row in 'index' to its value tuple
+        By default 'index' maps the single key column to a dictionary holding the JSON of every value column
+        '''
+        row_dict = dict()
+        for row_key, row_info in index.items():
+            row_dict[(row_key,)] = tuple([JSONTools.serialize_json(row_info[current_column]) for current_column in self.VALUE_COLUMNS])
+        return row_dict
+
+    def _build_index(self, row_list):
+        '''
+        Returns the index for the manager from 'row_list', a list of tuples of the key and value columns
+        '''
+        index = dict()
+        for current_row in row_list:
+            index[current_row[0]] = dict()
+            for current_column, column_value in zip(self.VALUE_COLUMNS, current_row[1:]):
+                index[current_row[0]][current_column] = JSONTools.read_json(column_value)
+        return index
+
+    def _select_rows(self):
+        column_list = self.KEY_COLUMNS + self.VALUE_COLUMNS
+        return self.catalog.connection.execute("SELECT " + ", ".join(column_list) + " FROM " + self.TABLE).fetchall()
+
+    def _write_rows(self, connection, changed_rows, removed_keys=list()):
+        key_condition = " AND ".join([current_column + " = ?" for current_column in self.KEY_COLUMNS])
+        column_list = self.KEY_COLUMNS + self.VALUE_COLUMNS
+        connection.executemany("DELETE FROM " + self.TABLE + " WHERE " + key_condition, removed_keys)
+        connection.executemany("INSERT OR REPLACE INTO " + self.TABLE + " (" + ", ".join(column_list) + ") VALUES (" + ", ".join(["?"] * len(column_list)) + ")", [row_key + row_value for row_key, row_value in changed_rows.items()])
+
+    def load(self):
+        with self.catalog.lock:
+            row_list = self._select_rows()
+        key_length = len(self.KEY_COLUMNS)
+        self.snapshot = dict()
+        for current_row in row_list:
+            self.snapshot[tuple(current_row[:key_length])] = tuple(current_row[key_length:])
+        return self._build_index(row_list)
+
+    def _write(self, index):
+        if self.snapshot == None:
+            self.load()
+        new_rows = self._get_rows(index)
+        changed_rows = dict()
+        for row_key, row_value in new_rows.items():
+            if not self.snapshot.get(row_key) == row_value:
+                changed_rows[row_key] = row_value
+        removed_keys = [row_key for row_key in self.snapshot if not row_key in new_rows]
+        if len(changed_rows) == 0 and len(removed_keys) == 0:
+            return
+        with self.catalog.lock:
+            with self.catalog.connection:
+                self._write_rows(self.catalog.connection, changed_rows, removed_keys)
+            FileTools.write_string(self.change_path, repr(time.time()))
+        self.snapshot = new_rows
+
+class LibraryCatalogStore(CatalogStore):
+    TABLE = "libraries"
+    KEY_COLUMNS = ["id"]
+    VALUE_COLUMNS = ["path"]
+
+class BinaryCatalogStore(CatalogStore):
+    TABLE = "binaries"
+    KEY_COLUMNS = ["name", "type"]
+    VALUE_COLUMNS = ["position", "notes"]
+
+    def _get_rows(self, index):
+        row_dict = dict()
+        for position, version_listing in enumerate(index):
+            row_dict[(version_listing["name"], version_listing["type"])] = (position, version_listing.get("notes"))
+        return row_dict
+
+    def _build_index(self, row_list):
+        index = list()
+        for version_name, version_type, position, version_notes in sorted(row_list, key=lambda current_row: current_row[2]):
+            version_listing = dict()
+            version_listing["type"] = version_type
+            version_listing["name"] = version_name
+            if not version_notes == None:
+                version_listing["notes"] = version_notes
+            index.append(version_listing)
+        return index
+
+class ProfileCatalogStore(CatalogStore):
+    TABLE = "profiles"
+    KEY_COLUMNS = ["name"]
+    VALUE_COLUMNS = ["directory"]
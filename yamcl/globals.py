@@ -13,8 +13,189 @@ You should have received a copy of the GNU General Public License
 along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
 '''
 
+import http.client
+import io
+import threading
+import urllib.error
+import urllib.parse
 import urllib.request
 
+class PooledResponse:
+    '''
+    File-like wrapper around an HTTP response that hands its connection back to the ConnectionPool
+    once the body has been read completely or the response is closed
+    '''
+    def __init__(self, connection_pool, pool_key, connection, response, url_string):
+        self._connection_pool = connection_pool
+        self._pool_key = pool_key
+        self._connection = connection
+        self._response = response
+        self._url_string = url_string
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.msg
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        if len(data) == 0 or self._response.isclosed():
+            self.close()
+        return data
+
+    def readinto(self, buffer):
+        read_count = self._response.readinto(buffer)
+        if read_count == 0 or self._response.isclosed():
+            self.close()
+        return read_count
+
+    def getheader(self, name, default=None):
+        return self._response.getheader(name, default)
+
+    def info(self):
+        return self.headers
+
+    def geturl(self):
+        return self._url_string
+
+    def close(self):
+        '''
+        Returns the connection to the pool. A partially read response cannot be reused, so its connection is closed first
+        '''
+        if self._connection == None:
+            return
+        if not self._response.isclosed():
+            self._response.close()
+            self._connection.close()
+        self._connection_pool.release(self._pool_key, self._connection)
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+class ConnectionPool:
+    '''
+    Keeps HTTP(S) connections alive between requests, grouped by host
+    At most 'host_limit' connections are in use per host at any time
+    '''
+    REDIRECT_CODES = (301, 302, 303, 307, 308)
+    REDIRECT_LIMIT = 5
+    REPEATABLE_METHODS = ("GET", "HEAD")
+
+    def __init__(self, host_limit=8):
+        self.host_limit = host_limit
+        self._condition = threading.Condition()
+        self._idle_connections = dict()
+        self._active_counts = dict()
+        self._statistics = dict()
+
+    def get_host_limit(self):
+        return self.host_limit
+
+    def set_host_limit(self, value):
+        if value < 1:
+            raise ValueError("Host limit must be at least 1")
+        with self._condition:
+            self.host_limit = value
+            self._condition.notify_all()
+
+    def get_statistics(self):
+        '''
+        Returns a dictionary of hosts to dictionaries with the number of "requests", "opened" connections and "reused" connections
+        '''
+        with self._condition:
+            statistics_copy = dict()
+            for current_host in self._statistics:
+                statistics_copy[current_host] = dict(self._statistics[current_host])
+            return statistics_copy
+
+    def _acquire(self, pool_key):
+        with self._condition:
+            while self._active_counts.get(pool_key, 0) >= self.host_limit:
+                self._condition.wait()
+            self._active_counts[pool_key] = self._active_counts.get(pool_key, 0) + 1
+            if not pool_key[1] in self._statistics:
+                self._statistics[pool_key[1]] = dict(requests=0, opened=0, reused=0)
+            idle_list = self._idle_connections.setdefault(pool_key, list())
+            if len(idle_list) > 0:
+                return idle_list.pop()
+        if pool_key[0] == "https":
+            return http.client.HTTPSConnection(pool_key[1])
+        return http.client.HTTPConnection(pool_key[1])
+
+    def release(self, pool_key, connection):
+        '''
+        Puts 'connection' back into the idle list of 'pool_key'
+        '''
+        with self._condition:
+            self._idle_connections[pool_key].append(connection)
+            self._active_counts[pool_key] -= 1
+            self._condition.notify()
+
+    def _count_request(self, pool_key, connection):
+        with self._condition:
+            host_statistics = self._statistics[pool_key[1]]
+            host_statistics["requests"] += 1
+            if connection.sock == None:
+                host_statistics["opened"] += 1
+            else:
+                host_statistics["reused"] += 1
+
+    def _send(self, pool_key, connection, method, path, data, headers):
+        was_connected = not (connection.sock == None)
+        request_sent = False
+        self._count_request(pool_key, connection)
+        try:
+            connection.request(method, path, data, headers)
+            request_sent = True
+            return connection.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server dropped an idle keep-alive connection, so try once more on a new one
+            # A request that was sent completely is only sent again if repeating it is harmless, which a POST to the auth server is not
+            connection.close()
+            if not was_connected or (request_sent and not method in ConnectionPool.REPEATABLE_METHODS):
+                raise
+            self._count_request(pool_key, connection)
+            connection.request(method, path, data, headers)
+            return connection.getresponse()
+
+    def request(self, url_string, data=None, headers=dict()):
+        '''
+        Performs a GET request (or POST if 'data' is specified) and returns a file-like response
+        Raises urllib.error.HTTPError for error status codes like urllib.request.urlopen does
+        '''
+        for redirect_count in range(ConnectionPool.REDIRECT_LIMIT + 1):
+            split_url = urllib.parse.urlsplit(url_string)
+            if not split_url.scheme in ("http", "https") or split_url.scheme in urllib.request.getproxies():
+                return urllib.request.urlopen(urllib.request.Request(url_string, data, headers))
+            pool_key = (split_url.scheme, split_url.netloc)
+            request_path = urllib.parse.urlunsplit(("", "", split_url.path or "/", split_url.query, ""))
+            request_headers = dict(headers)
+            if not data == None and not "Content-Type" in request_headers:
+                request_headers["Content-Type"] = "application/x-www-form-urlencoded"
+            connection = self._acquire(pool_key)
+            try:
+                response = self._send(pool_key, connection, "GET" if data == None else "POST", request_path, data, request_headers)
+            except BaseException:
+                connection.close()
+                self.release(pool_key, connection)
+                raise
+            pooled_response = PooledResponse(self, pool_key, connection, response, url_string)
+            if response.status < 300:
+                return pooled_response
+            error_body = pooled_response.read()
+            if response.status in ConnectionPool.REDIRECT_CODES and not response.getheader("Location") == None:
+                url_string = urllib.parse.urljoin(url_string, response.getheader("Location"))
+                if response.status == 303:
+                    data = None
+                continue
+            raise urllib.error.HTTPError(url_string, response.status, response.reason, response.msg, io.BytesIO(error_body))
+        raise urllib.error.HTTPError(url_string, response.status, "Too many redirects", response.msg, io.BytesIO())
+
 class URL:
     protocol = "https://"
     # Base URLs
@@ -23,6 +204,9 @@ class URL:
     LIBRARIES = protocol + "libraries.minecraft.net/" # Requires HTTPS protocol
     AUTH = protocol + "authserver.mojang.com/"
 
+    # Shared by every URL so connections to the hosts above are kept alive between requests
+    connection_pool = ConnectionPool()
+
     def __init__(self, new_path, url_type=""):
         '''
         The path must be a relative path
@@ -39,7 +223,7 @@ class URL:
         '''
         Returns a URL object
         '''
-        return urllib.request.urlopen(urllib.request.Request(self.__str__(), data, headers))
+        return URL.connection_pool.request(self.__str__(), data, headers)
 
     def __str__(self):
         '''
@@ -14,11 +14,11 @@ along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
 '''
 
 import copy
-import hashlib
 import pathlib
 
 from yamcl.globals import URL
-from yamcl.tools import FileTools
+from yamcl.network import NetworkTools
+from yamcl.tools import FileTools, IndexStore
 
 class LibraryManager:
     def __init__(self, launcher_obj):
@@ -26,11 +26,20 @@ class LibraryManager:
         self.download_exclusive = True
         self.BASE_PATH = self.Launcher.ROOT_PATH.joinpath("lib")
 
-        self.index_path = str(self.BASE_PATH.joinpath("index.json"))
-        self.index = FileTools.read_json(self.index_path)
+        if self.Launcher.Catalog == None:
+            self.index_store = IndexStore(str(self.BASE_PATH.joinpath("index.json")))
+        else:
+            self.index_store = self.Launcher.Catalog.get_store("libraries")
+        self.index = self.index_store.load()
 
     def _flush_index(self):
-        FileTools.write_json(self.index_path, self.index)
+        self.index_store.save(self.index)
+
+    def batch(self):
+        '''
+        Returns a context manager that writes the library index once for all changes made inside it
+        '''
+        return self.index_store.batch()
 
     def get_all_library_ids(self):
         return list(self.index.keys())
@@ -52,8 +61,13 @@ class LibraryManager:
         return pathlib.Path(*self.index[library_id]["path"])
 
     def _download_library(self, library_metadata):
+        '''
+        Downloads the jar or natives of 'library_metadata' if they are missing
+        Returns the path parts to store in the index for the library, or None if nothing was downloaded
+        This does not modify the index, so it can run on several libraries at the same time
+        '''
         if self.download_exclusive and not library_metadata.current_system_supported():
-            return
+            return None
         if library_metadata.is_natives():
             if self.download_exclusive:
                 all_extensions = [library_metadata.get_current_system_natives_extension()]
@@ -67,65 +81,70 @@ class LibraryManager:
                     if not self.is_natives_existant(library_metadata, current_extension):
                         natives_list.append(current_extension)
                 if natives_list == list():
-                    return # Natives already exists
+                    return None # Natives already exists
             else:
-                return # Library already exists
+                return None # Library already exists
         if library_metadata.is_natives():
             download_list = library_metadata.get_download_list(natives_list)
         else:
             download_list = library_metadata.get_download_list()
         for current_library in download_list:
-            current_tries = 1
-            while current_tries <= 3:
-                correct_hash = current_library["hash"].url_object().read().decode("UTF-8")
-                FileTools.write_object(str(self.BASE_PATH.joinpath(current_library["path"])), current_library["url"].url_object())
-                hasher = hashlib.sha1()
-                hasher.update(open(str(self.BASE_PATH.joinpath(current_library["path"])), mode="rb").read())
-                if hasher.hexdigest() == correct_hash:
-                    if library_metadata.is_natives():
-                        natives_directory = self.BASE_PATH.joinpath(current_library["path"].parent.joinpath(current_library["natives_extension"]))
-                        jar_path = str(self.BASE_PATH.joinpath(current_library["path"]))
-                        FileTools.extract_jar_files(FileTools.get_jar_object(jar_path), str(natives_directory), library_metadata.get_natives_exclude())
-                        FileTools.delete_and_clean(jar_path)
-                    break
-                else:
-                    current_tries += 1
-            if current_tries == 3:
-                raise Exception("Failed to download library " + library_metadata.get_id()) # TODO: More appropriate exception
-        self.index[library_metadata.get_id()] = dict()
+            correct_hash = current_library["hash"].url_object().read().decode("UTF-8")
+            if library_metadata.is_natives():
+                # Natives jars are extracted straight from memory instead of being written to the library directory first
+                jar_file = NetworkTools.download_spooled(current_library["url"], correct_hash)[0]
+                if jar_file == None:
+                    raise Exception("Failed to download library " + library_metadata.get_id()) # TODO: More appropriate exception
+                natives_directory = self.BASE_PATH.joinpath(current_library["path"].parent.joinpath(current_library["natives_extension"]))
+                with jar_file, FileTools.get_jar_object(jar_file) as jar_object:
+                    FileTools.extract_jar_files(jar_object, str(natives_directory), library_metadata.get_natives_exclude())
+            else:
+                jar_path = str(self.BASE_PATH.joinpath(current_library["path"]))
+                if not NetworkTools.download_file(current_library["url"], jar_path, correct_hash)[0]:
+                    raise Exception("Failed to download library " + library_metadata.get_id()) # TODO: More appropriate exception
+                self.Launcher.BlobStore.add(jar_path, correct_hash)
         if library_metadata.is_natives():
-            self.index[library_metadata.get_id()]["path"] = download_list[0]["path"].parent.parts
-        else:
-            self.index[library_metadata.get_id()]["path"] = download_list[0]["path"].parts
+            return list(download_list[0]["path"].parent.parts)
+        return list(download_list[0]["path"].parts)
 
     def download_missing(self, library_metadata_list, progress_function=None):
+        '''
+        Downloads the libraries in 'library_metadata_list' that are missing, several at a time
+        The index is updated in the order of 'library_metadata_list' and written once at the end
+        '''
         if not (progress_function == None):
-            downloaded_count = 0
             progress_function("Downloading libraries", 0)
+        unique_metadata_list = list()
+        queued_id_set = set()
         for current_metadata in library_metadata_list:
-            self._download_library(current_metadata)
-            if not (progress_function == None):
-                downloaded_count += 1
-                progress_function("Downloading libraries", downloaded_count/len(library_metadata_list))
+            if not current_metadata.get_id() in queued_id_set:
+                queued_id_set.add(current_metadata.get_id())
+                unique_metadata_list.append(current_metadata)
+        path_list = self.Launcher.DownloadPool.run(self._download_library, unique_metadata_list, "Downloading libraries", progress_function)
+        for current_metadata, library_path in zip(unique_metadata_list, path_list):
+            if not library_path == None:
+                self.index[current_metadata.get_id()] = dict()
+                self.index[current_metadata.get_id()]["path"] = library_path
         self._flush_index()
 
     def get_platform_paths(self, library_metadata_list):
-        libraries_dict = dict()
-        libraries_dict["jars"] = list()
-        libraries_dict["natives"] = list()
-        for current_metadata in library_metadata_list:
-            if current_metadata.current_system_supported():
-                if not self.is_library_existant(current_metadata):
-                    raise Exception("Library", current_metadata.get_id(), "does not exist") # TODO: More appropriate exception
-                base_path = self.BASE_PATH.joinpath(self.get_library_path(current_metadata.get_id()))
-                if current_metadata.is_natives():
-                    current_extension = current_metadata.get_current_system_natives_extension()
-                    if not self.is_natives_existant(current_metadata, current_extension):
-                        raise Exception("Natives", current_extension, "for library", current_metadata.get_id(), "does not exist") # TODO: More appropriate exception
-                    libraries_dict["natives"].append(str(base_path.joinpath(current_extension)))
-                else:
-                    libraries_dict["jars"].append(str(base_path))
-        return libraries_dict
+        with self.Launcher.SpanLog.span("LibraryManager.get_platform_paths"):
+            libraries_dict = dict()
+            libraries_dict["jars"] = list()
+            libraries_dict["natives"] = list()
+            for current_metadata in library_metadata_list:
+                if current_metadata.current_system_supported():
+                    if not self.is_library_existant(current_metadata):
+                        raise Exception("Library", current_metadata.get_id(), "does not exist") # TODO: More appropriate exception
+                    base_path = self.BASE_PATH.joinpath(self.get_library_path(current_metadata.get_id()))
+                    if current_metadata.is_natives():
+                        current_extension = current_metadata.get_current_system_natives_extension()
+                        if not self.is_natives_existant(current_metadata, current_extension):
+                            raise Exception("Natives", current_extension, "for library", current_metadata.get_id(), "does not exist") # TODO: More appropriate exception
+                        libraries_dict["natives"].append(str(base_path.joinpath(current_extension)))
+                    else:
+                        libraries_dict["jars"].append(str(base_path))
+            return libraries_dict
 
     def add_local(self, library_id, is_natives, source_paths, destination_path):
         '''
@@ -148,6 +167,7 @@ class LibraryManager:
                     pass
         else:
             FileTools.copy(source_paths[0], str(final_path))
+            self.Launcher.BlobStore.add(str(final_path))
         self.index[library_id] = dict()
         self.index[library_id]["path"] = list(final_path.relative_to(self.BASE_PATH).parts)
         self._flush_index()
@@ -25,6 +25,11 @@ import yamcl.libraries
 import yamcl.managers
 import yamcl.profiles
 import yamcl.accounts
+import yamcl.network
+import yamcl.catalog
+import yamcl.blobs
+import yamcl.spans
+import yamcl.supervisor
 
 class Launcher:
     def __init__(self):
@@ -32,11 +37,12 @@ class Launcher:
         self.PLATFORM_LIST = ["linux", "windows", "osx"]
         self.VERSION = "0.1.3"
 
-    def startup(self, data_path=str(), java_command=str()):
+    def startup(self, data_path=str(), java_command=str(), use_catalog=False):
         '''
         -Initializes all the classes.
         -"data_path" has path to YAMCL_data. If blank, set path to the current directory of this program.
         -Will setup YAMCL_data if necessary
+        -If "use_catalog" is True, the JSON indexes are migrated into an SQLite catalog. A catalog is always used once it exists
         '''
         if len(data_path) == 0:
             self.ROOT_PATH = pathlib.Path(os.path.expanduser("~"), ".yamcl")
@@ -49,7 +55,17 @@ class Launcher:
 
         if (self.check_data_integrity()):
             self.PlatformTools = yamcl.tools.PlatformTools(java_command)
+            self.DownloadPool = yamcl.network.DownloadPool()
+            self.SpanLog = yamcl.spans.SpanLog(self)
+            self.GameSupervisor = yamcl.supervisor.GameSupervisor(self)
 
+            self.Catalog = None
+            if yamcl.catalog.Catalog.exists(self.ROOT_PATH):
+                self.Catalog = yamcl.catalog.Catalog(self.ROOT_PATH)
+            elif use_catalog:
+                self.Catalog = yamcl.catalog.Catalog.create(self.ROOT_PATH)
+
+            self.BlobStore = yamcl.blobs.BlobStore(self)
             self.BinaryManager = yamcl.binaries.BinaryManager(self)
             self.LibraryManager = yamcl.libraries.LibraryManager(self)
             self.ProfileManager = yamcl.profiles.ProfileManager(self)
@@ -87,3 +103,6 @@ class Launcher:
         Launcher cleans itself up and exits
         '''
         self.AccountManager.shutdown()
+        self.GameSupervisor.shutdown()
+        if not self.Catalog == None:
+            self.Catalog.close()
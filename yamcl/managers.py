@@ -13,17 +13,28 @@ You should have received a copy of the GNU General Public License
 along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
 '''
 
+import collections
+import http.client
+import os
 import pathlib
+import threading
+import urllib.error
 
 from yamcl.tools import FileTools, JSONTools
 from yamcl.globals import URL
+from yamcl.network import NetworkTools
 
 class AssetsManager:
+    INDEX_CACHE_SIZE = 8 # Number of parsed asset indexes kept in memory
+
     def __init__(self, launcher_obj):
         self.Launcher = launcher_obj
 
         self.BASE_PATH = self.Launcher.ROOT_PATH.joinpath("assets")
 
+        self._index_cache = collections.OrderedDict()
+        self._index_cache_lock = threading.Lock()
+
     def download_index(self, asset_id):
         '''
         Downloads the JSON asset index specified by 'asset_id'
@@ -32,82 +43,164 @@ class AssetsManager:
         asset_index_path = str(self.BASE_PATH.joinpath("indexes/" + asset_id + ".json"))
         FileTools.write_object(asset_index_path, asset_url_object)
 
+    def has_index(self, asset_id):
+        return self.BASE_PATH.joinpath("indexes/" + asset_id + ".json").exists()
+
     def _is_virtual(self, asset_info):
         if ("virtual" in asset_info):
             return asset_info["virtual"] == True
         return False
 
+    def _read_index(self, asset_id):
+        '''
+        Returns a tuple of the parsed asset index 'asset_id' and whether it is virtual
+        Parsed indexes are cached until the modification time or size of the index file changes
+        The returned index is shared with the cache and must not be modified
+        '''
+        index_path = str(self.BASE_PATH.joinpath("indexes/" + asset_id + ".json"))
+        index_stat = os.stat(index_path)
+        file_signature = (index_stat.st_mtime_ns, index_stat.st_size)
+        with self._index_cache_lock:
+            if index_path in self._index_cache and self._index_cache[index_path][0] == file_signature:
+                self._index_cache.move_to_end(index_path)
+                return self._index_cache[index_path][1]
+        asset_info = FileTools.read_json(index_path)
+        parsed_index = (asset_info, self._is_virtual(asset_info))
+        with self._index_cache_lock:
+            self._index_cache[index_path] = (file_signature, parsed_index)
+            self._index_cache.move_to_end(index_path)
+            while len(self._index_cache) > AssetsManager.INDEX_CACHE_SIZE:
+                self._index_cache.popitem(last=False)
+        return parsed_index
+
     def download_missing(self, asset_id, progress_function=None):
         '''
         Downloads assets specified in 'asset_id' that are not already downloaded
+        Every object is checked against its hash in the index. Returns a dictionary with the number of objects
+        "downloaded", the number that "failed" after all retries, and the number of attempts that were "retried"
         '''
-        asset_info = FileTools.read_json(str(self.get_paths(asset_id)["index"]))
+        self.get_paths(asset_id) # Raises an exception if the index does not exist
+        asset_info, is_virtual = self._read_index(asset_id)
         asset_list = asset_info["objects"]
 
         if not (progress_function == None):
             progress_function("Finding missing assets", 0)
-        asset_dict = dict()
-        if (self._is_virtual(asset_info)):
-            assets_base_path = self.BASE_PATH.joinpath("virtual/" + asset_id)
-            if not assets_base_path.exists():
-                for asset_name in asset_list.keys():
-                    asset_url = URL([asset_list[asset_name]["hash"][:2], asset_list[asset_name]["hash"]], URL.RESOURCES)
-                    asset_dict[asset_url] = str(assets_base_path.joinpath(asset_name))
-        else:
-            for asset in asset_list.values():
-                asset_relative_path = [asset["hash"][:2], asset["hash"]]
+        asset_job_list = list()
+        queued_hash_set = set()
+        for asset in asset_list.values():
+            asset_relative_path = [asset["hash"][:2], asset["hash"]]
+            asset_path = self.BASE_PATH.joinpath(*(["objects"] + asset_relative_path))
+            if not asset["hash"] in queued_hash_set and not asset_path.exists():
+                queued_hash_set.add(asset["hash"])
                 asset_url = URL(asset_relative_path, URL.RESOURCES)
-                asset_path = self.BASE_PATH.joinpath(*(["objects"] + asset_relative_path))
-                if not asset_path.exists():
-                    asset_dict[asset_url] = str(asset_path)
-
-        asset_count = 0
-        asset_total_count = len(asset_dict)
-        for asset_url in asset_dict.keys():
-            asset_url_object = asset_url.url_object()
-            FileTools.write_object(asset_dict[asset_url], asset_url_object)
-            asset_count += 1
-            if not (progress_function == None):
-                progress_function("Downloading assets", asset_count/asset_total_count)
+                asset_job_list.append((asset_url, str(asset_path), asset["hash"]))
+
+        download_results = self.Launcher.DownloadPool.run(self._download_object, asset_job_list, "Downloading assets", progress_function)
+        download_counts = dict()
+        download_counts["downloaded"] = 0
+        download_counts["failed"] = 0
+        download_counts["retried"] = 0
+        verified_object_list = list()
+        for asset_job, (success, failed_attempts) in zip(asset_job_list, download_results):
+            if success:
+                download_counts["downloaded"] += 1
+                verified_object_list.append((asset_job[2], FileTools.get_size(asset_job[1])))
+            else:
+                download_counts["failed"] += 1
+            download_counts["retried"] += failed_attempts
+        if not self.Launcher.Catalog == None and len(verified_object_list) > 0:
+            self.Launcher.Catalog.add_asset_objects(verified_object_list)
+
+        if is_virtual:
+            # Virtual assets are built from the objects store instead of being downloaded a second time
+            assets_base_path = self.BASE_PATH.joinpath("virtual/" + asset_id)
+            link_job_list = list()
+            for asset_name in asset_list.keys():
+                asset_hash = asset_list[asset_name]["hash"]
+                object_path = self.BASE_PATH.joinpath("objects", asset_hash[:2], asset_hash)
+                virtual_path = assets_base_path.joinpath(asset_name)
+                if object_path.exists() and not virtual_path.exists():
+                    link_job_list.append((str(object_path), str(virtual_path)))
+            self.Launcher.DownloadPool.run(self._link_virtual_object, link_job_list, "Building virtual assets", progress_function)
+        return download_counts
+
+    def _download_object(self, asset_job):
+        '''
+        Downloads a single asset. 'asset_job' is a tuple of the URL, the destination path and the SHA-1 sum
+        '''
+        asset_url, asset_path, asset_hash = asset_job
+        return NetworkTools.download_file(asset_url, asset_path, asset_hash)
+
+    def _link_virtual_object(self, link_job):
+        '''
+        Places an object into a virtual assets directory. 'link_job' is a tuple of the object path and the virtual path
+        '''
+        object_path, virtual_path = link_job
+        return FileTools.link_file(object_path, virtual_path)
 
     def get_paths(self, asset_id):
         '''
         Returns a dictionary containing the path to the index and directory for assets ID 'asset_id'
         '''
-        asset_index_path = self.BASE_PATH.joinpath("indexes/" + asset_id + ".json")
-        if not asset_index_path.exists():
-            raise Exception("Assets ID " + asset_id + " does not exist")
+        with self.Launcher.SpanLog.span("AssetsManager.get_paths"):
+            asset_index_path = self.BASE_PATH.joinpath("indexes/" + asset_id + ".json")
+            if not asset_index_path.exists():
+                raise Exception("Assets ID " + asset_id + " does not exist")
 
-        asset_paths = dict()
-        asset_paths["index"] = asset_index_path
-        if self._is_virtual(FileTools.read_json(str(asset_index_path))):
-            asset_paths["directory"] = str(self.BASE_PATH.joinpath("virtual/" + asset_id))
+            asset_paths = dict()
+            asset_paths["index"] = asset_index_path
+            if self._read_index(asset_id)[1]:
+                asset_paths["directory"] = str(self.BASE_PATH.joinpath("virtual/" + asset_id))
+                return asset_paths
+            asset_paths["directory"] = self.BASE_PATH.joinpath("objects")
             return asset_paths
-        asset_paths["directory"] = self.BASE_PATH.joinpath("objects")
-        return asset_paths
 
     def _get_indexes(self):
         index_list = list()
+        if not self.BASE_PATH.joinpath("indexes").is_dir(): # Missing on a new data directory, and after the last index is deleted
+            return index_list
         for index_path in self.BASE_PATH.joinpath("indexes").iterdir():
             index_list.append(index_path.stem)
         return index_list
 
-    def _remove_unused_objects(self, asset_id_list):
+    def _remove_unused_objects(self, asset_id_list, dry_run=False):
         '''
         Removes assets from the 'objects' folder that are not present in the indexes 'asset_id_list'
-        This does not include virtual assets
+        Virtual assets directories only link to objects, so their objects are removed here too once no index uses them
+        If 'dry_run' is True, nothing is removed
+        Returns a dictionary with the "count" and total size in "bytes" of the unused objects
         '''
-        used_hash_list = list()
+        used_hash_set = set()
         for asset_id in asset_id_list:
-            current_assets = FileTools.read_json(str(self.get_paths(asset_id)["index"]))["objects"]
-            for resource in current_assets.keys():
-                current_hash = current_assets[resource]["hash"]
-                if not current_hash in used_hash_list:
-                    used_hash_list.append(current_hash)
-        for prefix_hash_dir in self.BASE_PATH.joinpath("objects").iterdir():
-            for hash_file in prefix_hash_dir.iterdir():
-                if not hash_file.name in used_hash_list:
-                    FileTools.delete_and_clean(str(hash_file))
+            current_assets = self._read_index(asset_id)[0]["objects"]
+            for resource in current_assets.values():
+                used_hash_set.add(resource["hash"])
+        unused_info = dict()
+        unused_info["count"] = 0
+        unused_info["bytes"] = 0
+        objects_path = str(self.BASE_PATH.joinpath("objects"))
+        if not FileTools.is_dir(objects_path):
+            return unused_info
+        for prefix_hash_entry in os.scandir(objects_path):
+            if not prefix_hash_entry.is_dir():
+                continue
+            unused_batch = list()
+            for hash_entry in os.scandir(prefix_hash_entry.path):
+                if not hash_entry.name in used_hash_set:
+                    unused_batch.append(hash_entry.path)
+                    unused_info["bytes"] += hash_entry.stat().st_size
+            unused_info["count"] += len(unused_batch)
+            if not dry_run and len(unused_batch) > 0:
+                FileTools.delete_files_and_clean(unused_batch)
+                if not self.Launcher.Catalog == None:
+                    self.Launcher.Catalog.remove_asset_objects([os.path.basename(unused_path) for unused_path in unused_batch])
+        return unused_info
+
+    def get_reclaimable_objects(self):
+        '''
+        Returns a dictionary with the "count" and total size in "bytes" of objects not used by any index
+        '''
+        return self._remove_unused_objects(self._get_indexes(), dry_run=True)
 
     def delete(self, asset_id):
         '''
@@ -115,12 +208,12 @@ class AssetsManager:
         '''
         asset_paths = self.get_paths(asset_id)
 
-        if self._is_virtual(FileTools.read_json(str(asset_paths["index"]))):
+        if self._read_index(asset_id)[1]:
             FileTools.delete_and_clean(str(asset_paths["directory"]))
-            FileTools.delete_and_clean(str(asset_paths["index"]))
-        else:
-            FileTools.delete_and_clean(str(asset_paths["index"]))
-            self._remove_unused_objects(self._get_indexes())
+        FileTools.delete_and_clean(str(asset_paths["index"]))
+        with self._index_cache_lock:
+            self._index_cache.pop(str(asset_paths["index"]), None)
+        self._remove_unused_objects(self._get_indexes())
 
     def get_unused(self, binary_metadata_list):
         '''
@@ -141,14 +234,57 @@ class VersionsListManager:
     def __init__(self, launcher_obj):
         self.Launcher = launcher_obj
 
+        self.versions_path = str(self.Launcher.ROOT_PATH.joinpath("bin", "versions.json"))
+        self.validators_path = str(self.Launcher.ROOT_PATH.joinpath("bin", "versions_validators.json"))
         self.versions_json = None
+        self.version_lookup = dict() # Maps version IDs to their listing in self.versions_json
+        self.validators = dict()
+        if FileTools.is_file(self.versions_path):
+            self._set_versions(FileTools.read_json(self.versions_path))
+            if FileTools.is_file(self.validators_path):
+                self.validators = FileTools.read_json(self.validators_path)
+
+    def _set_versions(self, versions_json):
+        self.versions_json = versions_json
+        self.version_lookup = dict()
+        for current_version in self.versions_json["versions"]:
+            self.version_lookup[current_version["id"]] = current_version
 
     def download_versions(self):
         '''
         Downloads the latest versions.json from the official servers
+        The download is skipped if the copy cached in the YAMCL data directory is still current
+        Returns "DOWNLOADED" if a new versions.json was stored, "NOT_MODIFIED" if the cached copy is current,
+        or "OFFLINE" if the servers could not be reached and the cached copy is used instead
         '''
-        tmp_file_object = URL("versions/versions.json", URL.DOWNLOAD).url_object()
-        self.versions_json = JSONTools.read_json(tmp_file_object.read().decode("UTF-8"))
+        request_headers = dict()
+        if not self.versions_json == None:
+            if "etag" in self.validators:
+                request_headers["If-None-Match"] = self.validators["etag"]
+            if "last_modified" in self.validators:
+                request_headers["If-Modified-Since"] = self.validators["last_modified"]
+        try:
+            tmp_file_object = URL("versions/versions.json", URL.DOWNLOAD).url_object(headers=request_headers)
+            raw_data = tmp_file_object.read()
+        except urllib.error.HTTPError as http_error:
+            if http_error.code == 304 and not self.versions_json == None:
+                return "NOT_MODIFIED"
+            if self.versions_json == None:
+                raise http_error
+            return "OFFLINE"
+        except (OSError, http.client.HTTPException) as network_error:
+            if self.versions_json == None:
+                raise network_error
+            return "OFFLINE"
+        self._set_versions(JSONTools.read_json(raw_data.decode("UTF-8")))
+        self.validators = dict()
+        if not tmp_file_object.getheader("ETag") == None:
+            self.validators["etag"] = tmp_file_object.getheader("ETag")
+        if not tmp_file_object.getheader("Last-Modified") == None:
+            self.validators["last_modified"] = tmp_file_object.getheader("Last-Modified")
+        FileTools.write_json(self.versions_path, self.versions_json)
+        FileTools.write_json(self.validators_path, self.validators)
+        return "DOWNLOADED"
 
     def get_versions(self):
         '''
@@ -157,10 +293,7 @@ class VersionsListManager:
         return self.versions_json
 
     def version_exists(self, version_id):
-        for current_version in self.versions_json["versions"]:
-            if current_version["id"] == version_id:
-                return True
-        return False
+        return version_id in self.version_lookup
 
     def get_latest_release(self):
         return self.versions_json["latest"]["release"]
@@ -0,0 +1,182 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+import concurrent.futures
+import hashlib
+import http.client
+import os
+import tempfile
+import time
+import urllib.error
+
+from yamcl.tools import FileTools
+
+class NetworkTools:
+    RETRY_COUNT = 3
+    RETRY_DELAY = 0.5 # Seconds before the first retry. Doubles with every retry after that
+    SPOOL_SIZE = 16777216 # Largest download that download_spooled keeps in memory
+    RETRY_HTTP_CODES = (408, 429) # Client error codes that are worth retrying. Server errors (5xx) are always retried
+
+    @staticmethod
+    def _wait_before_retry(failed_count):
+        if failed_count > 0:
+            time.sleep(NetworkTools.RETRY_DELAY * 2 ** (failed_count - 1))
+
+    @staticmethod
+    def _is_retryable(network_error):
+        '''
+        Returns False if 'network_error' is an HTTP error that another attempt would get again, like 404 Not Found
+        '''
+        if isinstance(network_error, urllib.error.HTTPError):
+            return network_error.code >= 500 or network_error.code in NetworkTools.RETRY_HTTP_CODES
+        return True
+
+    @staticmethod
+    def download_file(url_object, file_path, expected_hash=None):
+        '''
+        Downloads URL 'url_object' to 'file_path' through a ".part" file, which only replaces 'file_path' once it is complete
+        If 'expected_hash' is specified, the SHA-1 sum is checked while the data is written. Otherwise the size reported by the server is checked
+        A ".part" file left by a dropped connection is continued with a Range request. Files that do not match are thrown away
+        Every attempt is retried with an increasing delay, up to RETRY_COUNT attempts in total. Client errors like 404 are not retried
+        Returns a tuple of True if the file was downloaded (False otherwise) and the number of failed attempts
+        '''
+        part_path = file_path + ".part"
+        failed_count = 0
+        while failed_count < NetworkTools.RETRY_COUNT:
+            NetworkTools._wait_before_retry(failed_count)
+            try:
+                if NetworkTools._download_part(url_object, part_path, expected_hash):
+                    FileTools.replace(part_path, file_path)
+                    return (True, failed_count)
+                os.remove(part_path) # Not delete_and_clean, which could remove the directory another worker is downloading into
+            except (OSError, http.client.HTTPException) as network_error:
+                if not NetworkTools._is_retryable(network_error):
+                    return (False, failed_count + 1)
+                # The ".part" file is kept so the next attempt can continue it
+            failed_count += 1
+        return (False, failed_count)
+
+    @staticmethod
+    def download_spooled(url_object, expected_hash):
+        '''
+        Downloads URL 'url_object' into a temporary file object, which stays in memory unless it is larger than SPOOL_SIZE
+        The SHA-1 sum is checked against 'expected_hash' while the data is written, with the same retries as download_file
+        Returns a tuple of the file object positioned at its start (None if every attempt failed) and the number of failed attempts
+        '''
+        failed_count = 0
+        while failed_count < NetworkTools.RETRY_COUNT:
+            NetworkTools._wait_before_retry(failed_count)
+            spooled_file = tempfile.SpooledTemporaryFile(max_size=NetworkTools.SPOOL_SIZE)
+            hasher = hashlib.sha1()
+            try:
+                url_response = url_object.url_object()
+                try:
+                    FileTools.copy_object(url_response, spooled_file, hasher)
+                finally:
+                    url_response.close()
+                if hasher.hexdigest() == expected_hash:
+                    spooled_file.seek(0)
+                    return (spooled_file, failed_count)
+            except (OSError, http.client.HTTPException) as network_error:
+                if not NetworkTools._is_retryable(network_error):
+                    spooled_file.close()
+                    return (None, failed_count + 1)
+            spooled_file.close()
+            failed_count += 1
+        return (None, failed_count)
+
+    @staticmethod
+    def _download_part(url_object, part_path, expected_hash):
+        '''
+        Downloads the rest of URL 'url_object' into 'part_path'
+        Returns True if the ".part" file matches 'expected_hash' or the size reported by the server, False if it has to be thrown away
+        Raises http.client.IncompleteRead if the connection closed before the end of the file
+        '''
+        part_size = 0
+        if FileTools.is_file(part_path):
+            part_size = FileTools.get_size(part_path)
+        request_headers = dict()
+        if part_size > 0:
+            request_headers["Range"] = "bytes=" + str(part_size) + "-"
+        try:
+            url_response = url_object.url_object(headers=request_headers)
+        except urllib.error.HTTPError as http_error:
+            if http_error.code == 416: # The ".part" file is not a prefix of the file on the server
+                return False
+            raise http_error
+        hasher = None
+        if url_response.status == 206:
+            if not expected_hash == None:
+                hasher = FileTools.hash_file(part_path)
+        else:
+            if not expected_hash == None:
+                hasher = hashlib.sha1()
+            part_size = 0
+        total_size = None
+        content_range = url_response.getheader("Content-Range", "").rpartition("/")[2]
+        content_length = url_response.getheader("Content-Length", "")
+        if url_response.status == 206 and content_range.isdigit():
+            total_size = int(content_range)
+        elif content_length.isdigit():
+            total_size = part_size + int(content_length)
+        FileTools.write_object(part_path, url_response, append=(part_size > 0), hasher=hasher)
+        if not total_size == None:
+            written_size = FileTools.get_size(part_path)
+            if written_size < total_size:
+                raise http.client.IncompleteRead(b"", total_size - written_size)
+            if written_size > total_size:
+                return False
+        if not expected_hash == None:
+            return hasher.hexdigest() == expected_hash
+        return True
+
+class DownloadPool:
+    def __init__(self, worker_count=8):
+        self.worker_count = worker_count
+
+    def get_worker_count(self):
+        return self.worker_count
+
+    def set_worker_count(self, value):
+        if value < 1:
+            raise ValueError("Worker count must be at least 1")
+        self.worker_count = value
+
+    def run(self, task_function, task_list, progress_text=None, progress_function=None):
+        '''
+        Calls 'task_function' on every item in 'task_list' using at most 'worker_count' threads
+        Returns a list of the results in the same order as 'task_list'
+        'progress_function' is called from the calling thread with 'progress_text' and the fraction of finished tasks
+        If a task raises an exception, the remaining tasks are cancelled and the exception is raised again
+        '''
+        result_list = [None] * len(task_list)
+        if len(task_list) == 0:
+            return result_list
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.worker_count, len(task_list))) as executor:
+            future_dict = dict()
+            for task_count, current_task in enumerate(task_list):
+                future_dict[executor.submit(task_function, current_task)] = task_count
+            finished_count = 0
+            try:
+                for current_future in concurrent.futures.as_completed(future_dict):
+                    result_list[future_dict[current_future]] = current_future.result()
+                    finished_count += 1
+                    if not (progress_function == None):
+                        progress_function(progress_text, finished_count/len(task_list))
+            except BaseException:
+                for current_future in future_dict:
+                    current_future.cancel()
+                raise
+        return result_list
@@ -13,24 +13,41 @@ You should have received a copy of the GNU General Public License
 along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
 '''
 
-import subprocess
+import hashlib
+import pathlib
 import os
+import threading
+import urllib.request
+import zipfile
 
-from yamcl.tools import FileTools
+from yamcl.tools import FileTools, IndexStore
+from yamcl.binaries import BinaryMetadata
 
 class ProfileManager:
     def __init__(self, launcher_obj):
         self.Launcher = launcher_obj
         self.BASE_PATH = self.Launcher.ROOT_PATH.joinpath("profile")
 
-        self.index = FileTools.read_json(str(self.BASE_PATH.joinpath("index.json")))
+        if self.Launcher.Catalog == None:
+            self.index_store = IndexStore(str(self.BASE_PATH.joinpath("index.json")))
+        else:
+            self.index_store = self.Launcher.Catalog.get_store("profiles")
+        self.index = self.index_store.load()
         self.profile_instances = dict()
+        self._instances_lock = threading.Lock()
+        self.launch_plans = LaunchPlanCache(self.Launcher)
 
     def _flush_index(self):
         '''
         Writes current profile index in memory to the YAMCL data directory
         '''
-        FileTools.write_json(str(self.BASE_PATH.joinpath("index.json")), self.index)
+        self.index_store.save(self.index)
+
+    def batch(self):
+        '''
+        Returns a context manager that writes the profile index once for all changes made inside it
+        '''
+        return self.index_store.batch()
 
     def get_profile_list(self):
         '''
@@ -77,15 +94,16 @@ class ProfileManager:
         '''
         Returns a ProfileInstance of profile 'profile_name'
         '''
-        if not profile_name in self.index:
-            raise Exception("Profile " + str(profile_name) + " does not exist") # TODO: More appropriate exception
-        if profile_name in self.profile_instances:
-            return self.profile_instances[profile_name]
-        else:
-            profile_directory = self.BASE_PATH.joinpath(*self.index[profile_name]["directory"])
-            new_profile_instance = ProfileInstance(self.Launcher, profile_name, profile_directory)
-            self.profile_instances[profile_name] = new_profile_instance
-            return new_profile_instance
+        with self._instances_lock:
+            if not profile_name in self.index:
+                raise Exception("Profile " + str(profile_name) + " does not exist") # TODO: More appropriate exception
+            if profile_name in self.profile_instances:
+                return self.profile_instances[profile_name]
+            else:
+                profile_directory = self.BASE_PATH.joinpath(*self.index[profile_name]["directory"])
+                new_profile_instance = ProfileInstance(self.Launcher, profile_name, profile_directory)
+                self.profile_instances[profile_name] = new_profile_instance
+                return new_profile_instance
 
     def delete_profile_instance(self, profile_name):
         '''
@@ -101,6 +119,207 @@ class ProfileManager:
         '''
         pass
 
+class LaunchPlanCache:
+    '''
+    Keeps the parts of the launch command that only depend on installed files, for each version, platform and Java architecture
+    A plan is built again when the version json or jar, the library index or the asset index has changed since it was made
+    Plans are kept in the YAMCL data directory, so they also last between runs
+    Each plan also names a Class Data Sharing archive, which lets Java map the classes of the classpath instead of loading them from the jars
+    '''
+    PLAN_FORMAT = 5 # Plans made with another format are built again
+    CLASSPATH_MODES = ["argument", "argfile", "jar"]
+    ARGFILE_VERSION = 9 # First Java version that reads arguments from @argfiles
+    CDS_DYNAMIC_VERSION = 13 # First Java version with -XX:ArchiveClassesAtExit
+    CDS_AUTO_VERSION = 19 # First Java version with -XX:+AutoCreateSharedArchive
+
+    def __init__(self, launcher_obj):
+        self.Launcher = launcher_obj
+        self.class_data_sharing = True
+        self.classpath_mode = "argument"
+        self._lock = threading.RLock() # Games can be launched from several threads
+
+        self.cache_path = str(self.Launcher.ROOT_PATH.joinpath("bin", "launch_plans.json"))
+        self.CDS_PATH = self.Launcher.ROOT_PATH.joinpath("cds")
+        self.plans = dict()
+        if FileTools.is_file(self.cache_path):
+            self.plans = FileTools.read_json(self.cache_path)
+
+    def _get_signature(self, path_list):
+        '''
+        Returns a list with the modification time and size of every file in 'path_list', or None for files that do not exist
+        '''
+        signature_list = list()
+        for current_path in path_list:
+            try:
+                path_stat = os.stat(current_path)
+                signature_list.append([path_stat.st_mtime_ns, path_stat.st_size])
+            except FileNotFoundError:
+                signature_list.append(None)
+        return signature_list
+
+    def is_class_data_sharing(self):
+        return self.class_data_sharing
+
+    def set_class_data_sharing(self, value):
+        self.class_data_sharing = value
+
+    def get_classpath_mode(self):
+        return self.classpath_mode
+
+    def set_classpath_mode(self, value):
+        '''
+        Sets how the classpath is passed to Java: "argument" puts it on the command line,
+        "argfile" passes it in an @argfile (Java 9 and newer, otherwise "jar" is used),
+        and "jar" passes a small jar whose manifest Class-Path lists the libraries
+        '''
+        if not value in LaunchPlanCache.CLASSPATH_MODES:
+            raise ValueError("Classpath mode must be one of " + ", ".join(LaunchPlanCache.CLASSPATH_MODES))
+        self.classpath_mode = value
+
+    def _write_classpath_jar(self, jar_path, classpath_list):
+        '''
+        Writes a jar with no classes whose manifest Class-Path lists the files in 'classpath_list'
+        The files are given relative to the jar, since Java does not put classes from absolute Class-Path entries in Class Data Sharing archives
+        '''
+        url_list = list()
+        for current_path in classpath_list:
+            try:
+                url_list.append(urllib.request.pathname2url(os.path.relpath(current_path, os.path.dirname(jar_path))))
+            except ValueError: # Another drive on Windows
+                url_list.append(pathlib.Path(current_path).as_uri())
+        manifest_value = " ".join(url_list).encode("UTF-8")
+        manifest_lines = [b"Manifest-Version: 1.0"]
+        manifest_line = b"Class-Path: " + manifest_value
+        while len(manifest_line) > 0: # Manifest lines are at most 72 bytes. Longer values continue on lines starting with a space
+            line_size = 72 if len(manifest_lines) == 1 else 71
+            manifest_lines.append((b"" if len(manifest_lines) == 1 else b" ") + manifest_line[:line_size])
+            manifest_line = manifest_line[line_size:]
+        temporary_path = jar_path + ".tmp"
+        with zipfile.ZipFile(temporary_path, mode="w") as jar_file:
+            jar_file.writestr("META-INF/MANIFEST.MF", b"\r\n".join(manifest_lines) + b"\r\n\r\n")
+        FileTools.replace(temporary_path, jar_path)
+
+    def _get_classpath_mode(self, launch_plan):
+        if self.classpath_mode == "argfile" and (launch_plan["java_version"] == None or launch_plan["java_version"] < LaunchPlanCache.ARGFILE_VERSION):
+            return "jar"
+        return self.classpath_mode
+
+    def get_classpath_arguments(self, launch_plan):
+        '''
+        Returns the Java arguments that set the classpath of 'launch_plan' in the current classpath mode
+        The argfile or jar is written the first time it is needed, and kept until the plan is built again
+        '''
+        with self._lock:
+            classpath_mode = self._get_classpath_mode(launch_plan)
+            if classpath_mode == "argfile":
+                argfile_path = launch_plan["classpath_file"] + ".txt"
+                if not FileTools.is_file(argfile_path):
+                    quoted_classpath = launch_plan["classpath"].replace("\\", "\\\\").replace("\"", "\\\"")
+                    FileTools.write_string(argfile_path + ".tmp", "-cp\n\"" + quoted_classpath + "\"\n")
+                    FileTools.replace(argfile_path + ".tmp", argfile_path)
+                return ["@" + argfile_path]
+            if classpath_mode == "jar":
+                jar_path = launch_plan["classpath_file"] + ".jar"
+                if not FileTools.is_file(jar_path):
+                    self._write_classpath_jar(jar_path, launch_plan["classpath"].split(self.Launcher.PlatformTools.JAVA_PATH_DELIM))
+                return ["-cp", jar_path]
+            return ["-cp", launch_plan["classpath"]]
+
+    def _discard_plan_files(self, plan_key):
+        '''
+        Deletes the Class Data Sharing archives and classpath files of plan 'plan_key', except those another plan uses too
+        '''
+        old_plan = self.plans[plan_key]
+        other_plan_list = [current_plan for current_key, current_plan in self.plans.items() if not current_key == plan_key]
+        discarded_path_list = list()
+        if "class_data_archive" in old_plan and not old_plan["class_data_archive"] in [current_plan.get("class_data_archive") for current_plan in other_plan_list]:
+            discarded_path_list += [old_plan["class_data_archive"] + "-" + classpath_mode + ".jsa" for classpath_mode in LaunchPlanCache.CLASSPATH_MODES]
+        if "classpath_file" in old_plan and not old_plan["classpath_file"] in [current_plan.get("classpath_file") for current_plan in other_plan_list]:
+            discarded_path_list += [old_plan["classpath_file"] + ".txt", old_plan["classpath_file"] + ".jar"]
+        for current_path in discarded_path_list:
+            if FileTools.is_file(current_path):
+                FileTools.delete_and_clean(current_path)
+
+    def discard_version(self, version_id, version_type):
+        '''
+        Deletes the plans of version 'version_id' of type 'version_type' for every platform, with their Class Data Sharing archives
+        Called when the version is deleted or renamed
+        '''
+        with self._lock:
+            version_prefix = version_type + "/" + version_id + "/"
+            plan_key_list = [plan_key for plan_key in self.plans if plan_key.startswith(version_prefix) and plan_key.count("/") == version_prefix.count("/") + 1]
+            for plan_key in plan_key_list:
+                del self.plans[plan_key]
+            archive_directory = str(self.CDS_PATH.joinpath(version_type, version_id))
+            if FileTools.is_dir(archive_directory):
+                FileTools.delete_and_clean(archive_directory)
+            if len(plan_key_list) > 0:
+                FileTools.write_json(self.cache_path, self.plans)
+
+    def get_class_data_arguments(self, launch_plan):
+        '''
+        Returns the Java arguments that create or use the Class Data Sharing archive of 'launch_plan'
+        Java 19 and newer create and check the archive themselves. Java 13 to 18 write it when the game exits after the first launch
+        Returns an empty list if Class Data Sharing is disabled or the Java version does not support it
+        '''
+        java_version = launch_plan["java_version"]
+        if not self.class_data_sharing or java_version == None or java_version < LaunchPlanCache.CDS_DYNAMIC_VERSION:
+            return list()
+        archive_path = launch_plan["class_data_archive"] + "-" + self._get_classpath_mode(launch_plan) + ".jsa" # Java checks the archive against the classpath as it was given
+        FileTools.add_missing_dirs(archive_path)
+        if java_version >= LaunchPlanCache.CDS_AUTO_VERSION:
+            return ["-XX:+AutoCreateSharedArchive", "-XX:SharedArchiveFile=" + archive_path]
+        if FileTools.is_file(archive_path):
+            return ["-XX:SharedArchiveFile=" + archive_path]
+        return ["-XX:ArchiveClassesAtExit=" + archive_path]
+
+    def get_plan(self, version_id, version_type):
+        '''
+        Returns the launch plan of version 'version_id' of type 'version_type', building it if there is no current one
+        A plan is a dictionary with the "classpath", the "natives_path", the "main_class", the game "arguments" template,
+        the "version_name", the "assets_id", the "assets_directory", the "java_path" and "java_version" it was made for,
+        the path (without the classpath mode and extension) of its "class_data_archive", and the "classpath_file" path (without extension) of its argfile or classpath jar
+        A new plan discards the Class Data Sharing archives and classpath files of the plan it replaces, since they only match the files they were made from
+        '''
+        with self._lock:
+            java_path = self.Launcher.PlatformTools.get_java_path()
+            plan_key = "/".join([version_type, version_id, self.Launcher.PlatformTools.get_os_family(), self.Launcher.PlatformTools.get_java_arch()])
+            if plan_key in self.plans:
+                cached_plan = self.plans[plan_key]
+                if cached_plan.get("format") == LaunchPlanCache.PLAN_FORMAT and cached_plan["java_path"] == java_path and cached_plan["signature"] == self._get_signature(cached_plan["dependencies"]):
+                    return cached_plan
+                self._discard_plan_files(plan_key)
+
+            version_paths = self.Launcher.BinaryManager.get_paths(version_id, version_type)
+            with self.Launcher.SpanLog.span("binary_metadata"):
+                binary_metadata = self.Launcher.BinaryManager.get_binary_metadata(version_id, version_type)
+                library_metadata_list = binary_metadata.get_library_metadatas()
+            assets_id = binary_metadata.get_assets_id()
+            new_plan = dict()
+            new_plan["format"] = LaunchPlanCache.PLAN_FORMAT
+            new_plan["dependencies"] = [version_paths["json"], version_paths["jar"], self.Launcher.LibraryManager.index_store.change_path, str(self.Launcher.AssetsManager.BASE_PATH.joinpath("indexes", assets_id + ".json"))]
+            if not java_path == None:
+                new_plan["dependencies"].append(java_path) # An updated Java cannot use archives made by the old one
+            new_plan["signature"] = self._get_signature(new_plan["dependencies"]) # Taken before reading anything, so changes made while building are noticed next time
+            libraries_dict = self.Launcher.LibraryManager.get_platform_paths(library_metadata_list)
+            new_plan["classpath"] = self.Launcher.PlatformTools.JAVA_PATH_DELIM.join(libraries_dict["jars"] + [version_paths["jar"]])
+            new_plan["natives_path"] = self.Launcher.PlatformTools.JAVA_PATH_DELIM.join(libraries_dict["natives"])
+            new_plan["main_class"] = binary_metadata.get_launch_class()
+            new_plan["arguments"] = binary_metadata.get_arguments().split(" ")
+            new_plan["version_name"] = binary_metadata.get_id()
+            new_plan["assets_id"] = assets_id
+            new_plan["assets_directory"] = str(self.Launcher.AssetsManager.get_paths(assets_id)["directory"])
+            new_plan["java_path"] = java_path
+            new_plan["java_version"] = self.Launcher.PlatformTools.get_java_version()
+            archive_name = hashlib.sha1((str(java_path) + "\n" + new_plan["classpath"]).encode("UTF-8")).hexdigest()[:16]
+            new_plan["class_data_archive"] = str(self.CDS_PATH.joinpath(version_type, version_id, archive_name))
+            classpath_hash = hashlib.sha1(new_plan["classpath"].encode("UTF-8")).hexdigest()[:16]
+            new_plan["classpath_file"] = str(version_paths["directory"].joinpath(version_id + ".classpath-" + classpath_hash))
+            self.plans[plan_key] = new_plan
+            with self.Launcher.SpanLog.span("write_launch_plans"):
+                FileTools.write_json(self.cache_path, self.plans)
+            return new_plan
+
 class ProfileInstance:
     def __init__(self, launcher_obj, name, profile_path):
         self.Launcher = launcher_obj
@@ -170,6 +389,19 @@ class ProfileInstance:
         self.metadata["args"] = new_args
         self.flush_metadata()
 
+    def get_resource_policy(self):
+        '''
+        Returns the resource policy applied to games launched from this profile (see GameSupervisor.check_resource_policy)
+        '''
+        if not "resources" in self.metadata:
+            return dict()
+        return dict(self.metadata["resources"])
+
+    def set_resource_policy(self, new_policy):
+        self.Launcher.GameSupervisor.check_resource_policy(new_policy)
+        self.metadata["resources"] = dict(new_policy)
+        self.flush_metadata()
+
     def check_game_running(self):
         '''
         Checks to see if the game is still running
@@ -183,38 +415,47 @@ class ProfileInstance:
         '''
         Launches the game 'version_id' of type 'version_type'
         '''
-        game_binary_metadata = self.Launcher.BinaryManager.get_binary_metadata(version_id, version_type)
-        game_arguments = dict()
-        game_arguments["profile_name"] = self.profile_name
-        game_arguments["version_name"] = game_binary_metadata.get_id()
-        game_arguments["game_directory"] = str(self.data_path)
-        game_arguments["game_assets"] = str(self.Launcher.AssetsManager.get_paths(game_binary_metadata.get_assets_id())["directory"])
-        game_arguments["assets_root"] = str(self.Launcher.AssetsManager.BASE_PATH)
-        game_arguments["assets_index_name"] = game_binary_metadata.get_assets_id()
-
-        game_arguments["auth_username"] = self.Launcher.AccountManager.get_account().get_account_username()
-        game_arguments["auth_player_name"] = self.Launcher.AccountManager.get_account().get_game_username()
-        game_arguments["auth_uuid"] = self.Launcher.AccountManager.get_account().get_uuid()
-        game_arguments["auth_session"] = self.Launcher.AccountManager.get_account().get_session()
-        game_arguments["auth_access_token"] = self.Launcher.AccountManager.get_account().get_access_token()
-        game_arguments["user_type"] = self.Launcher.AccountManager.get_account().get_user_type()
-        game_arguments["user_properties"] = self.Launcher.AccountManager.get_account().get_user_properties()
-
-        version_paths = self.Launcher.BinaryManager.get_paths(version_id, version_type)
-
-        launch_arguments = list()
-        if self.Launcher.PlatformTools.get_java_path() == None:
-            raise Exception("Could not find a Java binary to launch") # TODO: more appropriate exception
-        launch_arguments.append(self.Launcher.PlatformTools.get_java_path())
-        launch_arguments += self.get_java_arguments().split(" ")
-        libraries_dict = self.Launcher.LibraryManager.get_platform_paths(game_binary_metadata.get_library_metadatas())
-        launch_arguments.append("-Djava.library.path=" + self.Launcher.PlatformTools.JAVA_PATH_DELIM.join(libraries_dict["natives"]))
-        launch_arguments.append("-cp")
-        launch_arguments.append(self.Launcher.PlatformTools.JAVA_PATH_DELIM.join(libraries_dict["jars"] + [version_paths["jar"]]))
-        launch_arguments.append(game_binary_metadata.get_launch_class())
-        launch_arguments += game_binary_metadata.generate_arguments(game_arguments)
-        os.chdir(game_arguments["game_directory"]) # Needed for logs to be created in the proper directory
-        self.game_process = subprocess.Popen(args=launch_arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        with self.Launcher.SpanLog.trace("launch", {"profile": self.profile_name, "version": version_id, "type": version_type}):
+            with self.Launcher.SpanLog.span("launch_plan"):
+                launch_plan = self.Launcher.ProfileManager.launch_plans.get_plan(version_id, version_type)
+            game_arguments = dict()
+            game_arguments["profile_name"] = self.profile_name
+            game_arguments["version_name"] = launch_plan["version_name"]
+            game_arguments["game_directory"] = str(self.data_path)
+            game_arguments["game_assets"] = launch_plan["assets_directory"]
+            game_arguments["assets_root"] = str(self.Launcher.AssetsManager.BASE_PATH)
+            game_arguments["assets_index_name"] = launch_plan["assets_id"]
+
+            with self.Launcher.SpanLog.span("account"):
+                game_arguments["auth_username"] = self.Launcher.AccountManager.get_account().get_account_username()
+                game_arguments["auth_player_name"] = self.Launcher.AccountManager.get_account().get_game_username()
+                game_arguments["auth_uuid"] = self.Launcher.AccountManager.get_account().get_uuid()
+                game_arguments["auth_session"] = self.Launcher.AccountManager.get_account().get_session()
+                game_arguments["auth_access_token"] = self.Launcher.AccountManager.get_account().get_access_token()
+                game_arguments["user_type"] = self.Launcher.AccountManager.get_account().get_user_type()
+                game_arguments["user_properties"] = self.Launcher.AccountManager.get_account().get_user_properties()
+
+            with self.Launcher.SpanLog.span("command"):
+                launch_arguments = list()
+                if self.Launcher.PlatformTools.get_java_path() == None:
+                    raise Exception("Could not find a Java binary to launch") # TODO: more appropriate exception
+                launch_arguments.append(self.Launcher.PlatformTools.get_java_path())
+                launch_arguments += self.get_java_arguments().split(" ")
+                launch_arguments += self.Launcher.ProfileManager.launch_plans.get_class_data_arguments(launch_plan)
+                launch_arguments.append("-Djava.library.path=" + launch_plan["natives_path"])
+                launch_arguments += self.Launcher.ProfileManager.launch_plans.get_classpath_arguments(launch_plan)
+                launch_arguments.append(launch_plan["main_class"])
+                launch_arguments += BinaryMetadata.fill_arguments(launch_plan["arguments"], game_arguments)
+            with self.Launcher.SpanLog.span("popen"):
+                self.game_process = self.Launcher.GameSupervisor.start(launch_arguments, game_arguments["game_directory"], self.profile_name, version_id, version_type, self.get_resource_policy()) # The game directory is needed for logs to be created in the proper directory
+
+    def get_resource_samples(self):
+        '''
+        Returns the resource samples of the running game (see GameSupervisor.get_samples), or an empty list if the game is not running
+        '''
+        if self.check_game_running():
+            return self.Launcher.GameSupervisor.get_samples(self.game_process.pid)
+        return list()
 
     def get_output_object(self):
         if self.check_game_running():
@@ -0,0 +1,114 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+import contextlib
+import threading
+import time
+
+from yamcl.tools import FileTools, JSONTools
+
+class SpanLog:
+    '''
+    Times the phases of an operation, like a launch, and appends them to a JSON lines log
+    Spans opened while a trace is running on the same thread are recorded in it. Other spans are not recorded
+    '''
+    LOG_LIMIT = 500 # Number of traces kept when the log is trimmed at startup
+
+    def __init__(self, launcher_obj):
+        self.Launcher = launcher_obj
+
+        self.log_path = str(self.Launcher.ROOT_PATH.joinpath("logs", "timings.jsonl"))
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._trim_log()
+
+    def _read_lines(self):
+        if not FileTools.is_file(self.log_path):
+            return list()
+        with open(self.log_path, mode="r", encoding=FileTools.TEXT_ENCODING) as log_file:
+            return [current_line for current_line in log_file.read().split("\n") if len(current_line) > 0]
+
+    def _trim_log(self):
+        line_list = self._read_lines()
+        if len(line_list) > SpanLog.LOG_LIMIT:
+            FileTools.write_string(self.log_path, "\n".join(line_list[-SpanLog.LOG_LIMIT:]) + "\n")
+
+    @contextlib.contextmanager
+    def trace(self, trace_name, attributes=dict()):
+        '''
+        Context manager that records one operation named 'trace_name' with the spans opened inside it
+        'attributes' is a dictionary stored with the trace, like the version being launched
+        The trace is written to the log when the context ends, with "failed" set if it ended with an exception
+        '''
+        trace_record = dict()
+        trace_record["name"] = trace_name
+        trace_record["time"] = time.time()
+        trace_record["attributes"] = dict(attributes)
+        trace_record["spans"] = list()
+        trace_record["failed"] = False
+        outer_state = (getattr(self._local, "trace", None), getattr(self._local, "depth", 0), getattr(self._local, "start_time", None))
+        start_time = time.perf_counter()
+        self._local.trace = trace_record
+        self._local.depth = 0
+        self._local.start_time = start_time
+        try:
+            yield trace_record
+        except BaseException:
+            trace_record["failed"] = True
+            raise
+        finally:
+            trace_record["duration_ms"] = (time.perf_counter() - start_time) * 1000
+            self._local.trace, self._local.depth, self._local.start_time = outer_state
+            with self._write_lock:
+                FileTools.add_missing_dirs(self.log_path)
+                with open(self.log_path, mode="a", encoding=FileTools.TEXT_ENCODING) as log_file:
+                    log_file.write(JSONTools.serialize_json(trace_record) + "\n")
+
+    @contextlib.contextmanager
+    def span(self, span_name):
+        '''
+        Context manager that times the phase 'span_name' of the trace running on this thread
+        '''
+        trace_record = getattr(self._local, "trace", None)
+        if trace_record == None:
+            yield
+            return
+        span_record = dict()
+        span_record["name"] = span_name
+        span_record["depth"] = self._local.depth
+        trace_record["spans"].append(span_record)
+        self._local.depth += 1
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            span_record["start_ms"] = (start_time - self._local.start_time) * 1000
+            span_record["duration_ms"] = (time.perf_counter() - start_time) * 1000
+            self._local.depth -= 1
+
+    def get_recent(self, count, trace_name=None):
+        '''
+        Returns a list of the last 'count' traces in the log, newest last
+        If 'trace_name' is specified, only traces with that name are returned
+        '''
+        trace_list = list()
+        for current_line in reversed(self._read_lines()):
+            if len(trace_list) >= count:
+                break
+            trace_record = JSONTools.read_json(current_line)
+            if trace_name == None or trace_record["name"] == trace_name:
+                trace_list.append(trace_record)
+        trace_list.reverse()
+        return trace_list
@@ -0,0 +1,380 @@
+'''
+YAMCL is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+YAMCL is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
+'''
+
+import collections
+import os
+import subprocess
+import sys
+import threading
+import time
+
+class GameSupervisor:
+    '''
+    Starts game processes and keeps track of them, so several games can run (and be launched from several threads) at once
+    Games are started in their own working directory. The working directory of YAMCL is never changed
+    Where /proc exists, the memory, CPU time, threads and open files of every game are sampled in a background thread
+    Games can be started with a resource policy (see check_resource_policy), which YAMCL applies to the game process as soon as it has started
+    '''
+    FINISHED_LIMIT = 20 # Number of finished games remembered by get_finished
+    SAMPLE_LIMIT = 600 # Number of samples kept for each game. Older samples are dropped
+    RESOURCE_POLICY_KEYS = ["cpu_affinity", "nice", "memory_limit", "open_files_limit", "cgroup_memory_max", "cgroup_cpu_max"]
+    CGROUP_CPU_PERIOD = 100000 # Microseconds
+
+    def __init__(self, launcher_obj):
+        self.Launcher = launcher_obj
+        self.sample_interval = 2.0
+
+        self._lock = threading.Lock()
+        self._games = dict() # Maps process IDs to tuples of the process, the game dictionary and the sample deque
+        self._finished_games = list()
+        self._sampler_thread = None
+        self._stop_event = threading.Event()
+        self._clock_ticks = 100
+        self._page_size = 4096
+        if hasattr(os, "sysconf"):
+            self._clock_ticks = os.sysconf("SC_CLK_TCK")
+            self._page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def get_sample_interval(self):
+        return self.sample_interval
+
+    def set_sample_interval(self, value):
+        '''
+        Sets the number of seconds between resource samples
+        '''
+        if value <= 0:
+            raise ValueError("Sample interval must be more than 0")
+        self.sample_interval = value
+
+    def is_sampling_supported(self):
+        return os.path.isdir("/proc/self")
+
+    @staticmethod
+    def check_resource_policy(resource_policy):
+        '''
+        Raises an exception if 'resource_policy' is not a valid resource policy. A resource policy is a dictionary that can contain:
+        "cpu_affinity": List of the CPU numbers the game can run on
+        "nice": Scheduling priority of the game, from -20 (highest) to 19 (lowest). Only root can go below the priority of YAMCL
+        "memory_limit": Largest address space of the game in bytes (RLIMIT_AS). The JVM reserves much more than its heap, so leave room above -Xmx
+        "open_files_limit": Largest number of files the game can have open (RLIMIT_NOFILE)
+        The two limits are only applied where the limits of another process can be set (Linux)
+        "cgroup_memory_max": Memory limit in bytes of a cgroup v2 group for the profile
+        "cgroup_cpu_max": Number of CPUs worth of time the cgroup v2 group for the profile can use, like 1.5
+        The cgroup group is created next to the cgroup of YAMCL, so the parent group must be writable and allow the memory and cpu controllers
+        That is usually only the case when running as root on a pure cgroup v2 system, or in a delegated systemd unit
+        (like "systemd-run --user --scope -p Delegate=yes"). Otherwise the cgroup entries are ignored, the other entries still apply,
+        and the "cgroup" of the game in get_running is None. Resource policies are not applied on Windows
+        '''
+        for policy_key in resource_policy:
+            if not policy_key in GameSupervisor.RESOURCE_POLICY_KEYS:
+                raise Exception("Unknown resource policy entry " + str(policy_key)) # TODO: More appropriate exception
+        if "cpu_affinity" in resource_policy:
+            if not isinstance(resource_policy["cpu_affinity"], list) or len(resource_policy["cpu_affinity"]) == 0:
+                raise Exception("cpu_affinity must be a list of CPU numbers") # TODO: More appropriate exception
+        for policy_key in ["nice", "memory_limit", "open_files_limit", "cgroup_memory_max"]:
+            if policy_key in resource_policy and not isinstance(resource_policy[policy_key], int):
+                raise Exception(policy_key + " must be an integer") # TODO: More appropriate exception
+        if "cgroup_cpu_max" in resource_policy and not resource_policy["cgroup_cpu_max"] > 0:
+            raise Exception("cgroup_cpu_max must be more than 0") # TODO: More appropriate exception
+        if "nice" in resource_policy:
+            if not -20 <= resource_policy["nice"] <= 19:
+                raise Exception("nice must be from -20 to 19") # TODO: More appropriate exception
+            if hasattr(os, "geteuid") and not os.geteuid() == 0 and resource_policy["nice"] < os.getpriority(os.PRIO_PROCESS, 0):
+                raise Exception("Only root can set nice below " + str(os.getpriority(os.PRIO_PROCESS, 0)) + ", the priority of YAMCL") # TODO: More appropriate exception
+
+    def _get_cgroup_parent(self):
+        '''
+        Returns the path of the cgroup v2 group that game cgroups are created in, or None if it is not writable
+        This is the parent of the cgroup of YAMCL, so game cgroups are leaves next to it. A game cgroup cannot be created
+        inside the cgroup of YAMCL, because a group with processes in it cannot give controllers to its children
+        When YAMCL runs in the root group, which is exempt from that rule, the root group is used
+        '''
+        if not os.path.isfile("/proc/self/cgroup"):
+            return None
+        cgroup_name = None
+        with open("/proc/self/cgroup", mode="r") as cgroup_file:
+            for current_line in cgroup_file.read().split("\n"):
+                if current_line.startswith("0::"):
+                    cgroup_name = current_line[3:]
+        if cgroup_name == None:
+            return None
+        for hierarchy_path in ["/sys/fs/cgroup", "/sys/fs/cgroup/unified"]: # The second path is used when cgroup v1 and v2 are both mounted
+            if os.path.isfile(os.path.join(hierarchy_path, "cgroup.controllers")):
+                cgroup_parent = os.path.join(hierarchy_path, os.path.dirname(cgroup_name.rstrip("/")).lstrip("/"))
+                if os.access(cgroup_parent, os.W_OK):
+                    return cgroup_parent
+                return None
+        return None
+
+    def _enable_controllers(self, cgroup_parent, controller_list):
+        '''
+        Makes the controllers in 'controller_list' available to the children of 'cgroup_parent'. Returns True if they all are
+        '''
+        with open(os.path.join(cgroup_parent, "cgroup.subtree_control"), mode="r") as control_file:
+            enabled_list = control_file.read().split()
+        for controller_name in controller_list:
+            if not controller_name in enabled_list:
+                try:
+                    with open(os.path.join(cgroup_parent, "cgroup.subtree_control"), mode="w") as control_file:
+                        control_file.write("+" + controller_name)
+                except OSError:
+                    return False # Not available in this group, or the group has processes in it
+        return True
+
+    def _prepare_cgroup(self, game_directory, resource_policy):
+        '''
+        Creates or updates the cgroup of the profile in 'game_directory' and returns its path
+        Returns None if the cgroup cannot be used (see check_resource_policy). No group is left behind in that case
+        '''
+        cgroup_parent = self._get_cgroup_parent()
+        if cgroup_parent == None:
+            return None
+        control_list = list()
+        if "cgroup_memory_max" in resource_policy:
+            control_list.append(("memory", "memory.max", str(resource_policy["cgroup_memory_max"])))
+        if "cgroup_cpu_max" in resource_policy:
+            control_list.append(("cpu", "cpu.max", str(int(resource_policy["cgroup_cpu_max"] * GameSupervisor.CGROUP_CPU_PERIOD)) + " " + str(GameSupervisor.CGROUP_CPU_PERIOD)))
+        cgroup_path = os.path.join(cgroup_parent, "yamcl-" + os.path.basename(game_directory))
+        created_group = False
+        try:
+            if not self._enable_controllers(cgroup_parent, [controller_name for controller_name, control_name, control_value in control_list]):
+                return None
+            if not os.path.isdir(cgroup_path):
+                os.mkdir(cgroup_path)
+                created_group = True
+            for controller_name, control_name, control_value in control_list:
+                with open(os.path.join(cgroup_path, control_name), mode="w") as control_file:
+                    control_file.write(control_value)
+        except OSError:
+            if created_group:
+                try:
+                    os.rmdir(cgroup_path)
+                except OSError:
+                    pass
+            return None
+        return cgroup_path
+
+    def _remove_cgroup(self, cgroup_path):
+        try:
+            os.rmdir(cgroup_path)
+        except OSError:
+            pass # Another game of the profile is still in the cgroup
+
+    def _get_threads(self, game_pid):
+        '''
+        Returns a list of the thread IDs of process 'game_pid', or just 'game_pid' where threads are not listed in /proc
+        '''
+        if not os.path.isdir("/proc/self/task"):
+            return [game_pid]
+        try:
+            return [int(thread_id) for thread_id in os.listdir("/proc/" + str(game_pid) + "/task")]
+        except FileNotFoundError: # The game has exited
+            return list()
+
+    def _apply_policy(self, game_pid, resource_policy, cgroup_path):
+        '''
+        Applies 'resource_policy' to running process 'game_pid' and moves it into the cgroup 'cgroup_path', if that is not None
+        This is done from YAMCL instead of in the forked process before Java starts (preexec_fn), which can deadlock while YAMCL has other threads
+        Returns the cgroup the game is in, which is None if it could not be moved. Raises OSError if the rest of the policy could not be applied
+        '''
+        if not cgroup_path == None:
+            try:
+                with open(os.path.join(cgroup_path, "cgroup.procs"), mode="w") as procs_file:
+                    procs_file.write(str(game_pid)) # Moves every thread of the game. Threads started later stay in the cgroup
+            except OSError:
+                self._remove_cgroup(cgroup_path)
+                cgroup_path = None
+        import resource
+        if hasattr(resource, "prlimit"):
+            for policy_key, limit_type in [("memory_limit", resource.RLIMIT_AS), ("open_files_limit", resource.RLIMIT_NOFILE)]:
+                if policy_key in resource_policy:
+                    hard_limit = resource.prlimit(game_pid, limit_type)[1]
+                    if not hard_limit == resource.RLIM_INFINITY:
+                        hard_limit = min(hard_limit, resource_policy[policy_key])
+                    else:
+                        hard_limit = resource_policy[policy_key]
+                    resource.prlimit(game_pid, limit_type, (hard_limit, hard_limit)) # The hard limit is lowered too, because the JVM raises its open files limit to the hard limit
+        if "cpu_affinity" in resource_policy or "nice" in resource_policy:
+            # The CPU affinity and priority belong to each thread on Linux, and new threads copy them from the thread that starts them
+            # Threads the game started before they were set are found by listing its threads again, until none is left
+            done_set = set()
+            while True:
+                thread_list = [thread_id for thread_id in self._get_threads(game_pid) if not thread_id in done_set]
+                if len(thread_list) == 0:
+                    break
+                for thread_id in thread_list:
+                    try:
+                        if "cpu_affinity" in resource_policy and hasattr(os, "sched_setaffinity"):
+                            os.sched_setaffinity(thread_id, resource_policy["cpu_affinity"])
+                        if "nice" in resource_policy:
+                            os.setpriority(os.PRIO_PROCESS, thread_id, resource_policy["nice"])
+                    except ProcessLookupError:
+                        pass # The thread has exited
+                    done_set.add(thread_id)
+        return cgroup_path
+
+    def start(self, launch_arguments, game_directory, profile_name, version_id, version_type, resource_policy=dict()):
+        '''
+        Starts the game command 'launch_arguments' in directory 'game_directory' and returns its subprocess.Popen object
+        'profile_name', 'version_id' and 'version_type' are stored with the game for get_running
+        'resource_policy' is applied to the game (see check_resource_policy)
+        '''
+        GameSupervisor.check_resource_policy(resource_policy)
+        cgroup_path = None
+        if "cgroup_memory_max" in resource_policy or "cgroup_cpu_max" in resource_policy:
+            cgroup_path = self._prepare_cgroup(game_directory, resource_policy)
+        game_process = None
+        try:
+            game_process = subprocess.Popen(args=launch_arguments, cwd=game_directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+            if not sys.platform == "win32" and (len(resource_policy) > 0 or not cgroup_path == None):
+                cgroup_path = self._apply_policy(game_process.pid, resource_policy, cgroup_path)
+        except OSError:
+            if not game_process == None:
+                game_process.kill() # The game must not run without its policy
+                game_process.communicate()
+            if not cgroup_path == None:
+                self._remove_cgroup(cgroup_path)
+            raise
+        game_info = dict()
+        game_info["pid"] = game_process.pid
+        game_info["profile"] = profile_name
+        game_info["version"] = version_id
+        game_info["type"] = version_type
+        game_info["start_time"] = time.time()
+        game_info["peak_rss_bytes"] = None
+        game_info["resource_policy"] = dict(resource_policy)
+        game_info["cgroup"] = cgroup_path
+        with self._lock:
+            self._games[game_process.pid] = (game_process, game_info, collections.deque(maxlen=GameSupervisor.SAMPLE_LIMIT))
+            if self.is_sampling_supported() and (self._sampler_thread == None or not self._sampler_thread.is_alive()):
+                self._sampler_thread = threading.Thread(target=self._sample_loop, name="YAMCL game sampler")
+                self._sampler_thread.daemon = True
+                self._sampler_thread.start()
+        return game_process
+
+    def _sample_loop(self):
+        '''
+        Samples every running game each 'sample_interval' seconds. Ends when no game is running
+        '''
+        while not self._stop_event.wait(self.sample_interval):
+            with self._lock:
+                self._reap()
+                if len(self._games) == 0:
+                    self._sampler_thread = None
+                    return
+                game_list = list(self._games.items())
+            for game_pid, (game_process, game_info, game_samples) in game_list:
+                last_sample = None
+                if len(game_samples) > 0:
+                    last_sample = game_samples[-1]
+                current_sample = self._read_sample(game_pid, last_sample)
+                if not current_sample == None:
+                    with self._lock:
+                        game_samples.append(current_sample)
+                        if game_info["peak_rss_bytes"] == None or current_sample["rss_bytes"] > game_info["peak_rss_bytes"]:
+                            game_info["peak_rss_bytes"] = current_sample["rss_bytes"]
+                        game_info["cpu_seconds"] = current_sample["cpu_seconds"]
+
+    def _read_sample(self, game_pid, last_sample):
+        '''
+        Returns a sample of the resources used by process 'game_pid' from /proc, or None if the process is gone
+        '''
+        process_path = "/proc/" + str(game_pid)
+        try:
+            with open(process_path + "/stat", mode="r") as stat_file:
+                stat_fields = stat_file.read().rpartition(")")[2].split() # The process name can contain spaces, so fields are counted after it
+            fd_count = len(os.listdir(process_path + "/fd"))
+        except OSError:
+            return None
+        current_sample = dict()
+        current_sample["time"] = time.time()
+        current_sample["rss_bytes"] = int(stat_fields[21]) * self._page_size
+        current_sample["cpu_seconds"] = (int(stat_fields[11]) + int(stat_fields[12])) / self._clock_ticks
+        current_sample["threads"] = int(stat_fields[17])
+        current_sample["fds"] = fd_count
+        current_sample["cpu_percent"] = None
+        if not last_sample == None and current_sample["time"] > last_sample["time"]:
+            current_sample["cpu_percent"] = (current_sample["cpu_seconds"] - last_sample["cpu_seconds"]) / (current_sample["time"] - last_sample["time"]) * 100
+        return current_sample
+
+    def get_samples(self, game_pid):
+        '''
+        Returns a list of the resource samples of running game 'game_pid', oldest first, or an empty list if it is not running
+        Each sample is a dictionary with the "time", "rss_bytes", "cpu_seconds", "threads", "fds" (open files),
+        and "cpu_percent" since the sample before it (None for the first sample)
+        '''
+        with self._lock:
+            if game_pid in self._games:
+                return list(self._games[game_pid][2])
+            return list()
+
+    def _reap(self):
+        '''
+        Moves games that have exited from the running games to the finished games. Must be called with the lock held
+        '''
+        for game_pid in list(self._games.keys()):
+            game_process, game_info, game_samples = self._games[game_pid]
+            if not game_process.poll() == None:
+                del self._games[game_pid]
+                game_info["exit_code"] = game_process.returncode
+                game_info["end_time"] = time.time()
+                self._finished_games.append(game_info)
+                if not game_info["cgroup"] == None:
+                    self._remove_cgroup(game_info["cgroup"])
+        del self._finished_games[:-GameSupervisor.FINISHED_LIMIT]
+
+    def get_running(self):
+        '''
+        Returns a list of dictionaries describing the running games, with the "pid", "profile", "version", "type", "start_time",
+        the largest memory use seen so far in "peak_rss_bytes" (None before the first sample),
+        the "resource_policy" it was started with, and the path of its "cgroup" (None if it is not in one)
+        '''
+        with self._lock:
+            self._reap()
+            return [dict(game_info) for game_process, game_info, game_samples in self._games.values()]
+
+    def get_finished(self):
+        '''
+        Returns a list of the last finished games, oldest first, like get_running with the "exit_code" and "end_time" added
+        Games that were sampled also have the "cpu_seconds" used up to their last sample
+        '''
+        with self._lock:
+            self._reap()
+            return [dict(game_info) for game_info in self._finished_games]
+
+    def get_process(self, game_pid):
+        '''
+        Returns the subprocess.Popen object of running game 'game_pid', or None if it is not running
+        '''
+        with self._lock:
+            self._reap()
+            if game_pid in self._games:
+                return self._games[game_pid][0]
+            return None
+
+    def shutdown(self):
+        '''
+        Stops sampling. Running games are left running
+        '''
+        self._stop_event.set()
+
+    def terminate_all(self):
+        '''
+        Asks every running game to exit
+        '''
+        with self._lock:
+            self._reap()
+            for game_process, game_info, game_samples in self._games.values():
+                game_process.terminate()
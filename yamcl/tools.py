@@ -13,11 +13,16 @@ You should have received a copy of the GNU General Public License
 along with YAMCL.  If not, see {http://www.gnu.org/licenses/}.
 '''
 
+import bisect
+import contextlib
+import hashlib
 import json
 import os.path
 import os
 import shutil
+import tempfile
 import zipfile
+import zlib
 import platform
 import sys
 import errno
@@ -37,6 +42,9 @@ class JSONTools:
 
 class FileTools:
     TEXT_ENCODING = "UTF-8"
+    CHUNK_SIZE = 65536
+    COPY_BUFFER_SIZE = 1048576 # Size of the buffer that copy_object reads into
+    FICLONE = 0x40049409 # Linux ioctl request for cloning a file
 
     # General methods
 
@@ -50,14 +58,58 @@ class FileTools:
             tmp_file_obj.write(file_string)
 
     @staticmethod
-    def write_object(file_path, file_object):
+    def write_object(file_path, file_object, append=False, hasher=None):
         '''
         Writes file in path 'file_path' with file object 'file_object'. Will create directories as necessary
+        If 'append' is True, the data is added to the end of the file instead of replacing it
+        If 'hasher' (a hashlib object) is specified, it is updated with the data as it is written
         '''
         FileTools.add_missing_dirs(file_path)
-        with open(file_path, mode="wb") as out_file:
-            shutil.copyfileobj(file_object, out_file)
-        file_object.close()
+        try:
+            with open(file_path, mode=("ab" if append else "wb")) as out_file:
+                FileTools.copy_object(file_object, out_file, hasher)
+        finally:
+            file_object.close()
+
+    @staticmethod
+    def copy_object(source_object, destination_object, hasher=None):
+        '''
+        Copies the rest of file object 'source_object' into file object 'destination_object'
+        If 'hasher' (a hashlib object) is specified, it is updated with the data as it is copied
+        Sources with readinto (like HTTP responses) are read into one buffer that is reused for the whole copy
+        '''
+        if not hasattr(source_object, "readinto"):
+            while True:
+                data_chunk = source_object.read(FileTools.COPY_BUFFER_SIZE)
+                if len(data_chunk) == 0:
+                    break
+                if not hasher == None:
+                    hasher.update(data_chunk)
+                destination_object.write(data_chunk)
+            return
+        copy_buffer = memoryview(bytearray(FileTools.COPY_BUFFER_SIZE))
+        while True:
+            read_size = source_object.readinto(copy_buffer)
+            if not read_size:
+                break
+            data_chunk = copy_buffer[:read_size]
+            if not hasher == None:
+                hasher.update(data_chunk)
+            destination_object.write(data_chunk)
+
+    @staticmethod
+    def hash_file(file_path):
+        '''
+        Returns a hashlib SHA-1 object updated with the contents of file 'file_path'
+        '''
+        hasher = hashlib.sha1()
+        with open(file_path, mode="rb") as in_file:
+            while True:
+                data_chunk = in_file.read(FileTools.CHUNK_SIZE)
+                if len(data_chunk) == 0:
+                    break
+                hasher.update(data_chunk)
+        return hasher
 
     # JSON methods
 
@@ -74,17 +126,28 @@ class FileTools:
     def write_json(json_path, json_obj):
         '''
         Writes JSON object 'json_obj' to path 'json_path'
+        The data is written and synced to a temporary file first, which then replaces 'json_path'. A crash leaves either the old or the new file
+        Every write uses its own temporary file, so writers in several threads do not mix their data
         '''
         FileTools.add_missing_dirs(json_path)
-        with open(json_path, mode="wb") as tmp_file_obj:
-            tmp_file_obj.write(JSONTools.create_json(json_obj).encode(FileTools.TEXT_ENCODING))
+        temporary_descriptor, temporary_path = tempfile.mkstemp(suffix=".tmp", prefix=os.path.basename(json_path) + ".", dir=os.path.dirname(json_path))
+        try:
+            with os.fdopen(temporary_descriptor, mode="wb") as tmp_file_obj:
+                tmp_file_obj.write(JSONTools.create_json(json_obj).encode(FileTools.TEXT_ENCODING))
+                tmp_file_obj.flush()
+                os.fsync(tmp_file_obj.fileno())
+            os.replace(temporary_path, json_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
 
     # jar file methods
 
     @staticmethod
     def get_jar_object(jar_path):
         '''
-        Creates a jar object from jar file on path 'jar_path'
+        Creates a jar object from jar file on path 'jar_path'. 'jar_path' can also be a seekable file object
         '''
         return zipfile.ZipFile(jar_path)
 
@@ -92,16 +155,58 @@ class FileTools:
     def extract_jar_files(jar_object, destination_dir, exclude_list=list()):
         '''
         Extracts files from jar_object 'jar_object' to directory 'destination_dir', excluding files in 'exclude_list'
+        Files that already exist with the same size and CRC are not written again
         '''
         jar_file_list = jar_object.namelist()
         if (len(exclude_list) > 0):
-            good_list = list()
-            for exclude in exclude_list:
-                for member in jar_file_list:
-                    if not member.startswith(exclude):
-                        good_list.append(member)
-            jar_file_list = good_list
-        jar_object.extractall(destination_dir, jar_file_list)
+            jar_file_list = FileTools._exclude_members(jar_file_list, exclude_list)
+        for member in jar_file_list:
+            if not FileTools._is_member_extracted(jar_object.getinfo(member), destination_dir):
+                jar_object.extract(member, destination_dir)
+
+    @staticmethod
+    def _exclude_members(member_list, exclude_list):
+        '''
+        Returns the members of 'member_list' that do not start with any prefix in 'exclude_list', in their original order
+        '''
+        exclude_prefixes = FileTools._minimal_prefixes(exclude_list)
+        good_list = list()
+        for member in member_list:
+            # Only the greatest prefix sorting at or before the member can be a prefix of it
+            prefix_position = bisect.bisect_right(exclude_prefixes, member)
+            if prefix_position == 0 or not member.startswith(exclude_prefixes[prefix_position - 1]):
+                good_list.append(member)
+        return good_list
+
+    @staticmethod
+    def _minimal_prefixes(prefix_list):
+        '''
+        Returns a sorted list of the prefixes in 'prefix_list', leaving out those that start with another prefix in the list
+        '''
+        minimal_list = list()
+        for current_prefix in sorted(set(prefix_list)):
+            if len(minimal_list) == 0 or not current_prefix.startswith(minimal_list[-1]):
+                minimal_list.append(current_prefix)
+        return minimal_list
+
+    @staticmethod
+    def _is_member_extracted(member_info, destination_dir):
+        '''
+        Returns True if jar member 'member_info' (a ZipInfo) already exists in 'destination_dir' with the same size and CRC
+        '''
+        if member_info.filename.endswith("/"):
+            return False
+        member_path = os.path.join(destination_dir, *member_info.filename.split("/"))
+        if not os.path.isfile(member_path) or not os.path.getsize(member_path) == member_info.file_size:
+            return False
+        member_crc = 0
+        with open(member_path, mode="rb") as member_file:
+            while True:
+                data_chunk = member_file.read(FileTools.CHUNK_SIZE)
+                if len(data_chunk) == 0:
+                    break
+                member_crc = zlib.crc32(data_chunk, member_crc)
+        return member_crc == member_info.CRC
 
     # Other methods
 
@@ -116,12 +221,110 @@ class FileTools:
     def copy(source_path, destination_path):
         '''
         Copies file 'source_path' into directory or file 'destination_path'
+        File data is copied with copy_file, so it stays inside the kernel where possible
         '''
         FileTools.add_missing_dirs(destination_path)
         if os.path.isdir(source_path):
-            shutil.copytree(source_path, destination_path)
+            shutil.copytree(source_path, destination_path, copy_function=FileTools._copy_with_mode)
         else:
-            shutil.copy(source_path, destination_path)
+            if os.path.isdir(destination_path):
+                destination_path = os.path.join(destination_path, os.path.basename(source_path))
+            FileTools._copy_with_mode(source_path, destination_path)
+
+    @staticmethod
+    def _copy_with_mode(source_path, destination_path):
+        FileTools.copy_file(source_path, destination_path)
+        shutil.copymode(source_path, destination_path)
+        return destination_path
+
+    @staticmethod
+    def reflink(source_path, destination_path):
+        '''
+        Clones file 'source_path' to 'destination_path' so both share the same data until one of them is written
+        Returns False if the platform or filesystem does not support it
+        '''
+        try:
+            import fcntl
+        except ImportError:
+            return False
+        with open(source_path, mode="rb") as source_file:
+            with open(destination_path, mode="wb") as destination_file:
+                try:
+                    fcntl.ioctl(destination_file.fileno(), FileTools.FICLONE, source_file.fileno())
+                    return True
+                except OSError:
+                    pass
+        os.remove(destination_path)
+        return False
+
+    @staticmethod
+    def copy_file(source_path, destination_path):
+        '''
+        Copies the data of file 'source_path' to 'destination_path' inside the kernel where possible. Will create directories as necessary
+        Tries os.copy_file_range, then os.sendfile, then a regular copy
+        Returns the method that was used: "copy_file_range", "sendfile" or "copy"
+        '''
+        FileTools.add_missing_dirs(destination_path)
+        with open(source_path, mode="rb") as source_file:
+            with open(destination_path, mode="wb") as destination_file:
+                source_size = os.fstat(source_file.fileno()).st_size
+                for copy_method in ["copy_file_range", "sendfile"]:
+                    if hasattr(os, copy_method) and FileTools._kernel_copy(copy_method, source_file.fileno(), destination_file.fileno(), source_size):
+                        return copy_method
+                shutil.copyfileobj(source_file, destination_file, FileTools.CHUNK_SIZE)
+        return "copy"
+
+    @staticmethod
+    def _kernel_copy(copy_method, source_fd, destination_fd, source_size):
+        '''
+        Copies 'source_size' bytes between file descriptors with 'copy_method'
+        Returns False without copying anything if the method is not supported for these files
+        '''
+        copied_size = 0
+        while copied_size < source_size:
+            try:
+                if copy_method == "copy_file_range":
+                    sent_size = os.copy_file_range(source_fd, destination_fd, source_size - copied_size)
+                else:
+                    sent_size = os.sendfile(destination_fd, source_fd, copied_size, source_size - copied_size)
+            except OSError as current_exception:
+                if copied_size == 0 and current_exception.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSOCK):
+                    return False
+                raise current_exception
+            if sent_size == 0:
+                break # The file became shorter while it was copied
+            copied_size += sent_size
+        return True
+
+    @staticmethod
+    def clone_file(source_path, destination_path):
+        '''
+        Creates 'destination_path' with the contents of 'source_path' as cheaply as possible. Will create directories as necessary
+        Tries a reflink, then copy_file
+        Returns the method that was used: "reflink", "copy_file_range", "sendfile" or "copy"
+        '''
+        FileTools.add_missing_dirs(destination_path)
+        if FileTools.reflink(source_path, destination_path):
+            return "reflink"
+        return FileTools.copy_file(source_path, destination_path)
+
+    @staticmethod
+    def link_file(source_path, destination_path):
+        '''
+        Makes file 'destination_path' have the contents of 'source_path', avoiding a copy where possible. Will create directories as necessary
+        Tries a hard link, then a reflink, then a regular copy
+        Returns the method that was used: "hardlink", "reflink" or "copy"
+        '''
+        FileTools.add_missing_dirs(destination_path)
+        try:
+            os.link(source_path, destination_path)
+            return "hardlink"
+        except OSError:
+            pass
+        if FileTools.reflink(source_path, destination_path):
+            return "reflink"
+        shutil.copyfile(source_path, destination_path)
+        return "copy"
 
     @staticmethod
     def delete_and_clean(path):
@@ -139,6 +342,23 @@ class FileTools:
             if not current_exception.errno == errno.ENOTEMPTY:
                 raise current_exception
 
+    @staticmethod
+    def delete_files_and_clean(path_list):
+        '''
+        Deletes all files in list 'path_list'
+        Directories that have become empty are removed once per directory, after all files are deleted
+        '''
+        directory_set = set()
+        for current_path in path_list:
+            os.remove(current_path)
+            directory_set.add(os.path.dirname(current_path))
+        for current_directory in directory_set:
+            try:
+                os.removedirs(current_directory)
+            except OSError as current_exception:
+                if not current_exception.errno == errno.ENOTEMPTY:
+                    raise current_exception
+
     @staticmethod
     def create_valid_name(name):
         '''
@@ -166,6 +386,13 @@ class FileTools:
         '''
         os.rename(src, dst)
 
+    @staticmethod
+    def replace(src, dst):
+        '''
+        Wrapper around os.replace
+        '''
+        os.replace(src, dst)
+
     @staticmethod
     def move(src, dst):
         '''
@@ -180,6 +407,13 @@ class FileTools:
         '''
         return os.path.exists(file_path)
 
+    @staticmethod
+    def get_size(file_path):
+        '''
+        Wrapper around os.path.getsize
+        '''
+        return os.path.getsize(file_path)
+
     @staticmethod
     def is_file(file_path):
         '''
@@ -200,6 +434,45 @@ class FileTools:
         '''
         return os.path.dirname(file_path)
 
+class IndexStore:
+    '''
+    Loads and saves a JSON index file
+    Saves made inside batch() are held back, and only the last one is written when the outermost batch ends
+    'change_path' is a file whose modification time and size change whenever the index is written, for callers that cache data built from the index
+    '''
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.change_path = index_path
+        self._batch_depth = 0
+        self._pending_index = None
+
+    def load(self):
+        return FileTools.read_json(self.index_path)
+
+    def _write(self, index):
+        FileTools.write_json(self.index_path, index)
+
+    def save(self, index):
+        if self._batch_depth > 0:
+            self._pending_index = index
+        else:
+            self._write(index)
+
+    @contextlib.contextmanager
+    def batch(self):
+        '''
+        Context manager that merges all saves made inside it into one write. Batches can be nested
+        '''
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and not self._pending_index == None:
+                pending_index = self._pending_index
+                self._pending_index = None
+                self._write(pending_index)
+
 class PlatformTools:
     def __init__(self, java_command):
         self.os_info = dict()
@@ -240,6 +513,9 @@ class PlatformTools:
                     if not "Error: This Java instance does not support a " in subprocess.Popen([self.java_path, current_argument], stderr=subprocess.PIPE).communicate()[1].decode("UTF-8").splitlines()[0]:
                         self.os_info["arch"] = arg_arch_check[current_argument]
 
+        self.java_version = None
+        self.java_version_checked = False
+
         self.os_info["family"] = current_platform
         if self.os_info["arch"] == None: # On Windows, this statement will be True if the hack fails
             self.os_info["arch"] = platform.architecture(self.java_path)[0][:2] # If path doesn't exist, it will return the architecture of the running Python interpreter. On Windows, it will always return the architecture of the current Python.
@@ -250,6 +526,42 @@ class PlatformTools:
         '''
         return self.java_path
 
+    def get_java_version(self):
+        '''
+        Returns the major version of the Java binary as an integer (8 for "1.8.0_292", 17 for "17.0.2"), or None if it is unknown
+        Java is only asked once, the first time this is called
+        '''
+        if not self.java_version_checked and not self.java_path == None:
+            import subprocess
+            self.java_version_checked = True
+            try:
+                version_output = subprocess.Popen([self.java_path, "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[1].decode("UTF-8", "replace")
+            except OSError:
+                return None
+            self.java_version = PlatformTools.parse_java_version(version_output)
+        return self.java_version
+
+    @staticmethod
+    def parse_java_version(version_output):
+        '''
+        Returns the major version in the output of "java -version", or None if it could not be found
+        '''
+        version_start = version_output.find("version \"")
+        if version_start == -1:
+            return None
+        version_string = version_output[version_start + len("version \""):].split("\"")[0]
+        version_parts = version_string.split(".")
+        if version_parts[0] == "1" and len(version_parts) > 1:
+            version_parts = version_parts[1:] # Java 8 and older are called 1.x
+        major_version = str()
+        for current_character in version_parts[0]:
+            if not current_character.isdigit():
+                break
+            major_version += current_character
+        if len(major_version) == 0:
+            return None
+        return int(major_version)
+
     def get_os_family(self):
         '''
         Returns the current OS family name. Either "windows", "osx", or "linux". Will return "linux" if it is not osx or windows